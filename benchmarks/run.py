@@ -0,0 +1,268 @@
+import argparse
+import json
+import platform
+import random
+import time
+import numpy as np
+from board import Board
+from game import Game
+from player import Player, WHITE, BLACK, BLUE
+from bots.greedy import Greedy
+from threats import ThreatSolver
+
+BENCHMARKS = {}
+
+
+def benchmark(name, max_size=None):
+    """Register a benchmark, it's called with (size, rng, repeat) and returns the seconds of each measured call"""
+    def register(function):
+        BENCHMARKS[name] = (function, max_size)
+        return function
+    return register
+
+
+def random_board(size, rng, fill=.5, players=2):
+    """A board with a random fill ratio of stones of the players in turns, and the players"""
+    board = Board(size, silent=True)
+    owners = [Player('P%d' % i, color) for i, color in enumerate((WHITE, BLACK, BLUE)[:players])]
+    cells = rng.permutation(size * size)[:int(size * size * fill)]
+    for i, cell in enumerate(cells.tolist()):
+        board.put_stone(divmod(cell, size), owners[(i // 2) % players])
+    return board, owners
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - start
+
+
+@benchmark('board.put_stone')
+def put_stone(size, rng, repeat):
+    samples = []
+    players = [Player('A', WHITE), Player('B', BLACK)]
+    for _ in range(repeat):
+        board = Board(size, silent=True)
+        cells = rng.permutation(size * size)[:min(size * size, 2000)].tolist()
+        for i, cell in enumerate(cells):
+            samples.append(timed(board.put_stone, divmod(cell, size), players[(i // 2) % 2]))
+    return samples
+
+
+@benchmark('board.get_max_partition')
+def get_max_partition(size, rng, repeat):
+    board, players = random_board(size, rng)
+    stones = board.history
+    samples = []
+    for _ in range(repeat * 100):
+        stone = stones[rng.integers(len(stones))]
+        samples.append(timed(board.get_max_partition, stone.owner, stone.pos))
+    return samples
+
+
+@benchmark('board.get_max_partition.full', max_size=51)
+def get_max_partition_full(size, rng, repeat):
+    board, players = random_board(size, rng)
+    return [timed(board.get_max_partition, players[i % 2]) for i in range(repeat)]
+
+
+@benchmark('utils.line_partition')
+def line_partition(size, rng, repeat):
+    board, _ = random_board(size, rng)
+    lines = board.utils.tables.lines
+    samples = []
+    for _ in range(repeat * 100):
+        x, y = lines[rng.integers(len(lines))]
+        samples.append(timed(board.utils.line_partition, x, y))
+    return samples
+
+
+@benchmark('utils.get_every_lines_indexes')
+def get_every_lines_indexes(size, rng, repeat):
+    board, _ = random_board(size, rng)
+    samples = [timed(lambda: list(board.utils.get_every_lines_indexes())) for _ in range(repeat)]
+    stones = board.history
+    for _ in range(repeat * 100):
+        point = stones[rng.integers(len(stones))].pos
+        samples.append(timed(lambda: list(board.utils.get_every_lines_indexes(point))))
+    return samples
+
+
+@benchmark('greedy.max_possibilities')
+def max_possibilities(size, rng, repeat):
+    board, _ = random_board(size, rng)
+    greedy = Greedy('G', WHITE)
+    lines = board.utils.tables.lines
+    samples = []
+    for _ in range(repeat * 100):
+        x, y = lines[rng.integers(len(lines))]
+        samples.append(timed(greedy.max_possibilities, board.grid[x, y], 1, 2))
+    return samples
+
+
+def prepared_greedy(size, rng, incremental):
+    board, players = random_board(size, rng, fill=.3)
+    greedy = Greedy('G', WHITE, incremental=incremental)
+    Game(board, [greedy] + players[1:], delay=0, shuffle_players=False, result_pause=0)
+    return board, greedy
+
+
+@benchmark('greedy.play')
+def greedy_play(size, rng, repeat):
+    """First stone of a turn of a new Greedy on a board filled 30%, so every line is scanned"""
+    samples = []
+    for _ in range(repeat):
+        board, greedy = prepared_greedy(size, rng, incremental=True)
+        samples.append(timed(lambda: next(greedy.play(board))))
+    return samples
+
+
+@benchmark('greedy.play.incremental')
+def greedy_play_incremental(size, rng, repeat):
+    """First stone of the next turn of Greedy after two rival stones, only their lines are scanned"""
+    samples = []
+    for _ in range(repeat):
+        board, greedy = prepared_greedy(size, rng, incremental=True)
+        rival = greedy.rivals[0]
+        next(greedy.play(board))
+        for _ in range(2):
+            empty = np.flatnonzero(board.grid.reshape(-1) == 0)
+            board.put_stone(divmod(int(rng.choice(empty)), size), rival)
+        samples.append(timed(lambda: next(greedy.play(board))))
+    return samples
+
+
+@benchmark('threats.solve', max_size=51)
+def threats_solve(size, rng, repeat):
+    """ThreatSolver on boards filled 20%, it's mostly the cost of finding no forced win"""
+    solver = ThreatSolver(max_depth=3, time_limit=10.)
+    samples = []
+    for _ in range(repeat):
+        board, players = random_board(size, rng, fill=.2)
+        samples.append(timed(solver.solve, board, players[0], players[1:]))
+    return samples
+
+
+@benchmark('connect_env.step')
+def connect_env_step(size, rng, repeat):
+    """ConnectEnv with random actions, its rival Greedy is prepared for SIZE, so it only runs on that size"""
+    import learning
+
+    if size != learning.SIZE:
+        return None
+
+    env = learning.ConnectEnv(gui=False)
+    samples = []
+    for _ in range(repeat * 20):
+        action = int(rng.integers(size * size))
+        start = time.perf_counter()
+        _, _, done, _ = env.step(action)
+        samples.append(time.perf_counter() - start)
+        if done:
+            env.reset()
+    return samples
+
+
+@benchmark('game.handle', max_size=51)
+def game_handle(size, rng, repeat):
+    """Full headless games between two Greedy players"""
+    samples = []
+    for _ in range(repeat):
+        seed = int(rng.integers(2 ** 31))
+        random.seed(seed)
+        np.random.seed(seed)
+        board = Board(size, silent=True)
+        game = Game(board, [Greedy('A', WHITE), Greedy('B', BLACK)], delay=0, result_pause=0)
+        samples.append(timed(game.handle))
+    return samples
+
+
+def summary(samples):
+    samples = np.array(samples) * 1e6
+    return {
+        'calls': len(samples),
+        'mean_us': float(samples.mean()),
+        'median_us': float(np.median(samples)),
+        'min_us': float(samples.min()),
+        'p90_us': float(np.percentile(samples, 90)),
+    }
+
+
+def run(names, sizes, seed=0, repeat=5):
+    results = []
+    for name in names:
+        function, max_size = BENCHMARKS[name]
+        for size in sizes:
+            result = {'name': name, 'size': size}
+            if max_size is not None and size > max_size:
+                result['skipped'] = 'size is over %d' % max_size
+            else:
+                try:
+                    samples = function(size, np.random.default_rng(seed), repeat)
+                except ImportError as error:
+                    samples = None
+                    result['skipped'] = str(error)
+
+                if samples is not None:
+                    result.update(summary(samples))
+                elif 'skipped' not in result:
+                    result['skipped'] = 'not supported for this size'
+
+            results.append(result)
+            print_result(result)
+
+    return {
+        'meta': {
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'seed': seed,
+            'repeat': repeat,
+        },
+        'results': results,
+    }
+
+
+def print_result(result, baseline=None):
+    label = '%-32s %5d' % (result['name'], result['size'])
+    if 'skipped' in result:
+        print(label, ' skipped:', result['skipped'])
+        return
+
+    line = '%s %12.2f us mean %12.2f us median %8d calls' % (
+        label, result['mean_us'], result['median_us'], result['calls'])
+    if baseline and 'median_us' in baseline:
+        line += '   %.2fx of baseline' % (result['median_us'] / baseline['median_us'])
+    print(line)
+
+
+def compare(report, baseline):
+    """Print the median of each result relative to the same benchmark and size in the baseline report"""
+    baselines = {(result['name'], result['size']): result for result in baseline['results']}
+    for result in report['results']:
+        print_result(result, baselines.get((result['name'], result['size'])))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark engine hot paths and bots')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[13, 19, 51, 201])
+    parser.add_argument('--only', nargs='+', choices=sorted(BENCHMARKS), help='run only these benchmarks')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--json', help='write the results to this file')
+    parser.add_argument('--compare', help='compare with the results in this file')
+    args = parser.parse_args()
+
+    report = run(args.only or list(BENCHMARKS), args.sizes, seed=args.seed, repeat=args.repeat)
+    if args.json:
+        with open(args.json, 'w') as file:
+            json.dump(report, file, indent=2)
+
+    if args.compare:
+        with open(args.compare) as file:
+            print()
+            compare(report, json.load(file))
+
+
+if __name__ == '__main__':
+    main()
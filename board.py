@@ -1,58 +1,126 @@
 import numpy as np
 import pygame
 import math
+import threading
 import time
+from array import array
 from stone import Stone
-from utils import Utils
+from utils import Utils, Partition, Symmetries, OFF_BOARD, zobrist_keys, canonical_hash
+from abc import abstractmethod
 from typing import Optional, List
 
 BOX_SIZE = 40
 BOARD_PADDING = 45
 BOTTOM_SIZE = 60
 
+# Steps of rows, columns, ascending and descending lines, in the same order as Utils.get_every_lines_indexes
+DIRECTIONS = ((0, 1), (1, 0), (1, -1), (1, 1))
 
-class Board(object):
-    def __init__(self, size, verbose=False):
+
+class BaseBoard(object):
+    def __init__(self, size, verbose=False, silent=False, reach=2):
         """
-        It's a basic board of the game. It contains map that is List[List[Optional[Stone]]] and store state of the game.
+        Interface and shared state of Board and SparseBoard. Players get an index on the board on their first use,
+        map and history are Stone instances of the stones that are created lazily. A silent board doesn't print
+        results. Empty cells within reach rows and columns of any stone are the candidates for the next stones.
         """
         self._size = size
+        self._reach = reach
         self.verbose = verbose
-        self._empty_count = size * size
-        self._map = np.empty((size, size), dtype=object)
-        self._utils = Utils(size, self._map)
+        self.silent = silent
+        self._players = [None]
+        self._indexes = {}
         self._history = []
-
-    def get(self, x, y) -> Optional[Stone]:
-        return self.map[x, y]
+        # map and history are synced lazily, and a play generator that Clock dropped may still read them
+        self._sync_lock = threading.Lock()
+        self._map = None
 
     @property
-    def utils(self):
-        return self._utils
+    def size(self):
+        """Number of rows and columns, None for an unbounded board"""
+        return self._size
 
     @property
     def history(self) -> List[Stone]:
+        self._sync()
         return self._history
 
-    @property
-    def size(self):
-        return self._size
-
     @property
     def map(self):
+        """Stone of each cell, an object array on Board and a dict of the occupied points on SparseBoard"""
+        self._sync()
         return self._map
 
     @property
+    def players(self):
+        """Registered players, the position of each player in this list is its index on the board"""
+        return self._players
+
+    def player_index(self, player):
+        """
+        Index of the player on the board, players are registered on their first use
+        :param player: Player
+        :return: int
+        """
+        index = self._indexes.get(player)
+        if index is None:
+            index = len(self._players)
+            if index > np.iinfo(np.int8).max:
+                raise ValueError('Too many players for the board')
+
+            self._indexes[player] = index
+            self._players.append(player)
+
+        return index
+
+    @property
+    @abstractmethod
+    def depth(self):
+        """Number of stones on the board, including pushed ones"""
+        pass
+
+    @property
+    @abstractmethod
+    def empty_count(self):
+        pass
+
+    @property
+    @abstractmethod
     def has_empty_cell(self):
-        return self._empty_count > 0
+        pass
+
+    @abstractmethod
+    def get(self, x, y) -> Optional[Stone]:
+        pass
 
+    @abstractmethod
     def is_valid(self, point):
-        row, col = point
-        return 0 <= row < self._size and 0 <= col < self._size
+        pass
 
+    @abstractmethod
     def is_empty(self, point):
-        row, col = point
-        return self._map[row, col] is None
+        pass
+
+    @abstractmethod
+    def candidates(self):
+        pass
+
+    @abstractmethod
+    def push(self, point, player):
+        """Put a stone without validation and rendering, it can be taken back by pop. It returns the longest run."""
+        pass
+
+    @abstractmethod
+    def pop(self):
+        pass
+
+    @abstractmethod
+    def get_runs(self, point):
+        pass
+
+    @abstractmethod
+    def get_max_partition(self, player, cross_point=None):
+        pass
 
     def draw(self):
         pass
@@ -67,22 +135,328 @@ class Board(object):
         :param player: Player
         :return: bool
         """
-        if not point or not self.is_empty(point):
+        if not point or not self.is_valid(point) or not self.is_empty(point):
             return False
 
-        self._empty_count -= 1
-        stone = Stone(owner=player, pos=point)
-        self._map[point] = stone
-        self._history.append(stone)
+        self.push(point, player)
+        self._sync()
         if self.verbose:
             print(player.title, 'put a stone at ', point)
         return True
 
+    @abstractmethod
+    def _placed(self, start):
+        """Position and player index of each stone from the start-th one, in the order they were put"""
+        pass
+
+    def _sync(self):
+        """Create Stone instances of the pushed stones for map and history"""
+        with self._sync_lock:
+            for pos, index in self._placed(len(self._history)):
+                stone = Stone(owner=self._players[index], pos=pos)
+                self._map[pos] = stone
+                self._history.append(stone)
+
+    def show_winner(self, player, partition):
+        if not self.silent:
+            print(player.title + ' win')
+
+    def show_draw(self):
+        if not self.silent:
+            print('DRAW')
+
+    def show_message(self, message):
+        if self.verbose:
+            print(message)
+
+
+class Board(BaseBoard):
+    def __init__(self, size, verbose=False, silent=False, reach=2):
+        """
+        It's a basic board of the game. The state is stored in grid that is an int8 array of player indices
+        (0 refers to an empty cell), map and history are kept as a view of Stone instances for compatibility.
+        A silent board is used to run headless games.
+        """
+        super().__init__(size, verbose, silent, reach)
+        self._empty_count = size * size
+        self._cells = np.zeros(size * size + 1, dtype=np.int8)
+        self._cells[-1] = OFF_BOARD
+        self._map = np.empty((size, size), dtype=object)
+        self._utils = Utils(size, self._cells, self._players)
+        self._grid = self._utils.grid
+        self._hash = 0
+
+        # For each direction and cell, the length of the run of stones right before the cell followed by
+        # the length of the run right after it, as a flat array. They are only kept up to date for empty cells,
+        # which is where the next stone can be put.
+        self._runs = array('i', bytes(4 * 2 * len(DIRECTIONS) * size * size))
+        self._zobrist = [None]
+
+        # Number of stones within reach of each cell, a cell is a candidate when it's empty and near a stone,
+        # and the flat indices of the candidates, cells join and leave it when their count crosses zero.
+        # Plain lists are faster than numpy for the few cells around each stone.
+        self._near = [0] * (size * size)
+        self._around = {}
+        self._candidates = set()
+
+        # Preallocated stack of pushed stones and the run counters each of them changed
+        capacity = size * size
+        self._depth = 0
+        self._moves = [0] * capacity
+        self._move_indexes = [0] * capacity
+        self._saved_at = [-1] * (capacity * 2 * len(DIRECTIONS))
+        self._saved = [0] * (capacity * 2 * len(DIRECTIONS))
+        self._run_counts = [0] * len(DIRECTIONS)
+        self._run_heads = [0] * len(DIRECTIONS)
+        self._run_depth = 0
+
+    def get(self, x, y) -> Optional[Stone]:
+        return self.map[x, y]
+
+    @property
+    def utils(self):
+        return self._utils
+
+    @property
+    def grid(self):
+        return self._grid
+
+    def player_index(self, player):
+        index = self._indexes.get(player)
+        if index is None:
+            index = super().player_index(player)
+            self._zobrist.append(zobrist_keys(self._size, index))
+
+        return index
+
+    @property
+    def depth(self):
+        """Number of stones on the board, including pushed ones"""
+        return self._depth
+
+    @property
+    def hash(self):
+        """Zobrist hash of the stones on the board, it's updated by put_stone"""
+        return self._hash
+
+    def canonical(self):
+        """
+        Canonical hash of the board, that is the same for all of its rotations and reflections, and the transform
+        of Symmetries that maps cells of this board to the canonical orientation. It's computed from the stones
+        on each call, so push and pop don't pay for it.
+        :return: Tuple[int, int]
+        """
+        return canonical_hash(self._grid)
+
+    @property
+    def symmetries(self):
+        return Symmetries.of(self._size)
+
+    @property
+    def has_empty_cell(self):
+        return self._empty_count > 0
+
+    @property
+    def empty_count(self):
+        return self._empty_count
+
+    def candidates(self):
+        """
+        Flat indices of empty cells within reach of any stone, they are kept up to date by push and pop.
+        On an empty board it's the center cell.
+        """
+        if not self._candidates and not self._depth:
+            return np.array([(self._size // 2) * self._size + self._size // 2])
+        return np.sort(np.fromiter(self._candidates, dtype=np.intp, count=len(self._candidates)))
+
+    def _cells_around(self, flat):
+        """Flat indices of the cells within reach of the cell, including itself"""
+        size, reach = self._size, self._reach
+        row, col = divmod(flat, size)
+        rows = range(max(row - reach, 0), min(row + reach + 1, size))
+        cols = range(max(col - reach, 0), min(col + reach + 1, size))
+        around = self._around[flat] = [r * size + c for r in rows for c in cols]
+        return around
+
+    def is_valid(self, point):
+        row, col = point
+        return 0 <= row < self._size and 0 <= col < self._size
+
+    def is_empty(self, point):
+        row, col = point
+        return self._grid[row, col] == 0
+
+    def push(self, point, player):
+        """
+        Put a stone without validation and rendering, it can be taken back by pop. It's meant for lookahead bots,
+        so it updates grid, run counters and hash in place and creates no Stone.
+        It returns the length of the longest run through the stone.
+        :param point: Tuple[int, int]
+        :param player: Player
+        :return: int
+        """
+        row, col = point
+        size = self._size
+        area = size * size
+        flat = row * size + col
+        index = self._indexes.get(player) or self.player_index(player)
+        cells = self._cells
+        runs = self._runs
+        depth = self._depth
+        saved = depth * 2 * len(DIRECTIONS)
+        longest = 0
+
+        for d, (dr, dc) in enumerate(DIRECTIONS):
+            before_at = 2 * d * area
+            after_at = before_at + area
+            before = after = 0
+            r, c = row - dr, col - dc
+            if 0 <= r < size and 0 <= c < size and cells.item(r * size + c) == index:
+                before = runs[before_at + flat]
+
+            r, c = row + dr, col + dc
+            if 0 <= r < size and 0 <= c < size and cells.item(r * size + c) == index:
+                after = runs[after_at + flat]
+
+            count = before + after + 1
+            self._run_counts[d] = count
+            self._run_heads[d] = flat - before * (dr * size + dc)
+            if count > longest:
+                longest = count
+
+            r, c = row - (before + 1) * dr, col - (before + 1) * dc
+            if 0 <= r < size and 0 <= c < size:
+                at = after_at + r * size + c
+                self._saved_at[saved] = at
+                self._saved[saved] = runs[at]
+                runs[at] = count
+            else:
+                self._saved_at[saved] = -1
+
+            r, c = row + (after + 1) * dr, col + (after + 1) * dc
+            if 0 <= r < size and 0 <= c < size:
+                at = before_at + r * size + c
+                self._saved_at[saved + 1] = at
+                self._saved[saved + 1] = runs[at]
+                runs[at] = count
+            else:
+                self._saved_at[saved + 1] = -1
+
+            saved += 2
+
+        near = self._near
+        candidates = self._candidates
+        for cell in self._around.get(flat) or self._cells_around(flat):
+            if not near[cell]:
+                candidates.add(cell)
+            near[cell] += 1
+        candidates.discard(flat)
+        cells[flat] = index
+        self._hash ^= self._zobrist[index].item(flat)
+        self._empty_count -= 1
+        self._moves[depth] = flat
+        self._move_indexes[depth] = index
+        self._depth = self._run_depth = depth + 1
+        return longest
+
+    def pop(self):
+        """Take back the latest stone and restore the board exactly as it was before it"""
+        depth = self._depth - 1
+        flat = self._moves[depth]
+        index = self._move_indexes[depth]
+        saved = depth * 2 * len(DIRECTIONS)
+        for at in range(saved + 2 * len(DIRECTIONS) - 1, saved - 1, -1):
+            if self._saved_at[at] >= 0:
+                self._runs[self._saved_at[at]] = self._saved[at]
+
+        near = self._near
+        candidates = self._candidates
+        for cell in self._around[flat]:
+            near[cell] -= 1
+            if not near[cell]:
+                candidates.discard(cell)
+        if near[flat]:
+            candidates.add(flat)
+        self._cells[flat] = 0
+        self._hash ^= self._zobrist[index].item(flat)
+        self._empty_count += 1
+        self._depth = depth
+        if depth < len(self._history):
+            stone = self._history.pop()
+            self._map[stone.pos] = None
+
+    def follow(self, board):
+        """
+        Bring this board to the position of another board with the same size by popping and pushing
+        only the stones that differ, it's used to keep scratch boards of bots in sync with the game board
+        """
+        common = 0
+        limit = min(self._depth, board.depth)
+        while (common < limit and self._moves[common] == board._moves[common] and
+               self._players[self._move_indexes[common]] is board.players[board._move_indexes[common]]):
+            common += 1
+
+        while self._depth > common:
+            self.pop()
+
+        for depth in range(common, board.depth):
+            self.push(divmod(board._moves[depth], self._size), board.players[board._move_indexes[depth]])
+
+    def _placed(self, start):
+        for depth in range(start, self._depth):
+            yield divmod(self._moves[depth], self._size), self._move_indexes[depth]
+
+    def _walk_runs(self, point):
+        row, col = point
+        index = self._grid[row, col]
+        runs = []
+        for dr, dc in DIRECTIONS:
+            start = end = row, col
+            while self.is_valid((start[0] - dr, start[1] - dc)) and self._grid[start[0] - dr, start[1] - dc] == index:
+                start = start[0] - dr, start[1] - dc
+
+            while self.is_valid((end[0] + dr, end[1] + dc)) and self._grid[end[0] + dr, end[1] + dc] == index:
+                end = end[0] + dr, end[1] + dc
+
+            count = max(abs(end[0] - start[0]), abs(end[1] - start[1])) + 1
+            runs.append((count, start, end))
+
+        return runs
+
+    def get_runs(self, point):
+        """
+        Runs of stones with the same owner through the point, in each direction as (count, start, end).
+        Runs of the latest stone are kept by push, otherwise it walks outward from the point.
+        """
+        row, col = point
+        if self._depth and self._run_depth == self._depth and self._moves[self._depth - 1] == row * self._size + col:
+            runs = []
+            for d, (dr, dc) in enumerate(DIRECTIONS):
+                count = self._run_counts[d]
+                start = divmod(self._run_heads[d], self._size)
+                end = start[0] + (count - 1) * dr, start[1] + (count - 1) * dc
+                runs.append((count, start, end))
+            return runs
+
+        return self._walk_runs(point)
+
     def get_max_partition(self, player, cross_point=None):
         max_count = 0
         max_part = None
 
-        for x, y in self.utils.get_every_lines_indexes(cross_point):
+        if cross_point is not None:
+            if self.is_empty(cross_point) or self._players[self._grid[tuple(cross_point)]] != player:
+                return None
+
+            for d, (count, start, end) in enumerate(self.get_runs(cross_point)):
+                if count > max_count:
+                    max_count = count
+                    start_index = int(self.utils.tables.cell_offsets[start[0], start[1], d])
+                    max_part = Partition(player, count, start_index, start_index + count - 1, start, end)
+
+            return max_part
+
+        for x, y in self.utils.get_every_lines_indexes():
             parts = self.utils.line_partition(x, y)
             for part in parts:
                 if part.player == player and part.count > max_count:
@@ -91,22 +465,179 @@ class Board(object):
 
         return max_part
 
-    def show_winner(self, player, partition):
-        print(player.title + ' win')
 
-    def show_draw(self):
-        print('DRAW')
+class SparseBoard(BaseBoard):
+    def __init__(self, size=None, verbose=False, silent=False, reach=2):
+        """
+        A board that keeps stones in a dict of occupied cells, so its memory and the cost of each stone scale
+        with the number of stones instead of the area. size=None makes an unbounded board without edges,
+        where cells can have any (even negative) coordinates. Empty cells within reach of any stone are kept
+        as candidates. It has no grid and line tables, bots query cells with values instead.
+        """
+        super().__init__(size, verbose, silent, reach)
+        self._stones = {}
+        self._order = []
+        self._near = {}
+        self._map = {}
+        self._keys = None
+        self._values = None
 
-    def show_message(self, message):
-        if self.verbose:
-            print(message)
+    @property
+    def depth(self):
+        return len(self._order)
+
+    @property
+    def has_empty_cell(self):
+        return self._size is None or len(self._order) < self._size * self._size
+
+    @property
+    def empty_count(self):
+        """Number of empty cells, None for an unbounded board"""
+        return None if self._size is None else self._size * self._size - len(self._order)
+
+    def get(self, x, y) -> Optional[Stone]:
+        return self.map.get((x, y))
+
+    def is_valid(self, point):
+        if self._size is None:
+            return True
+        row, col = point
+        return 0 <= row < self._size and 0 <= col < self._size
+
+    def is_empty(self, point):
+        return tuple(point) not in self._stones
+
+    def push(self, point, player):
+        """Put a stone without validation, it can be taken back by pop. It returns the longest run through it."""
+        point = (int(point[0]), int(point[1]))
+        self._stones[point] = self._indexes.get(player) or self.player_index(player)
+        self._order.append(point)
+        self._keys = None
+
+        row, col = point
+        near = self._near
+        for r in range(row - self._reach, row + self._reach + 1):
+            for c in range(col - self._reach, col + self._reach + 1):
+                near[r, c] = near.get((r, c), 0) + 1
+
+        return max(count for count, _, _ in self.get_runs(point))
+
+    def pop(self):
+        point = self._order.pop()
+        del self._stones[point]
+        self._keys = None
+
+        row, col = point
+        near = self._near
+        for r in range(row - self._reach, row + self._reach + 1):
+            for c in range(col - self._reach, col + self._reach + 1):
+                count = near[r, c] - 1
+                if count:
+                    near[r, c] = count
+                else:
+                    del near[r, c]
+
+        if len(self._order) < len(self._history):
+            stone = self._history.pop()
+            del self._map[stone.pos]
+
+    def _placed(self, start):
+        for point in self._order[start:]:
+            yield point, self._stones[point]
+
+    def candidates(self):
+        """
+        Empty cells within reach of any stone as an array of points with shape (n, 2),
+        on an empty board it's the center cell (or the origin of an unbounded board)
+        """
+        points = [point for point in self._near if point not in self._stones and self.is_valid(point)]
+        if not points and not self._order:
+            center = 0 if self._size is None else self._size // 2
+            points = [(center, center)]
+
+        return np.array(points, dtype=np.int64).reshape(-1, 2)
+
+    def values(self, points):
+        """
+        Player indices of the cells of an array of points with shape (..., 2), 0 refers to an empty cell and
+        OFF_BOARD to a cell out of a bounded board. Cells are looked up at once in the sorted occupied cells.
+        """
+        points = np.asarray(points, dtype=np.int64)
+        if self._keys is None:
+            occupied = np.array(list(self._stones), dtype=np.int64).reshape(-1, 2)
+            keys = self._key(occupied)
+            order = np.argsort(keys)
+            self._keys = keys[order]
+            self._values = np.fromiter(self._stones.values(), dtype=np.int8, count=len(self._stones))[order]
+
+        keys = self._key(points)
+        found = np.minimum(np.searchsorted(self._keys, keys), max(len(self._keys) - 1, 0))
+        values = np.zeros(keys.shape, dtype=np.int8)
+        if len(self._keys):
+            hit = self._keys[found] == keys
+            values[hit] = self._values[found[hit]]
+
+        if self._size is not None:
+            outside = ((points < 0) | (points >= self._size)).any(axis=-1)
+            values[outside] = OFF_BOARD
+        return values
+
+    @staticmethod
+    def _key(points):
+        # Coordinates are shifted to be positive and packed into one int64
+        return (points[..., 0] + 2 ** 30) * 2 ** 31 + (points[..., 1] + 2 ** 30)
+
+    def get_runs(self, point):
+        """Runs of stones with the same owner through the point, in each direction as (count, start, end)"""
+        row, col = point
+        index = self._stones.get((row, col))
+        runs = []
+        for dr, dc in DIRECTIONS:
+            before = 0
+            while self._stones.get((row - (before + 1) * dr, col - (before + 1) * dc)) == index:
+                before += 1
+
+            after = 0
+            while self._stones.get((row + (after + 1) * dr, col + (after + 1) * dc)) == index:
+                after += 1
+
+            start = row - before * dr, col - before * dc
+            end = row + after * dr, col + after * dc
+            runs.append((before + after + 1, start, end))
+
+        return runs
+
+    def get_max_partition(self, player, cross_point=None):
+        """
+        The longest run of the player through the cross point, or on the whole board if it's None.
+        start_index and end_index of the Partition are the positions of the ends along their line.
+        """
+        index = self._indexes.get(player)
+        if index is None:
+            return None
+
+        if cross_point is not None:
+            points = [tuple(cross_point)] if self._stones.get(tuple(cross_point)) == index else []
+        else:
+            points = [point for point, owner in self._stones.items() if owner == index]
+
+        max_part = None
+        for point in points:
+            for d, (count, start, end) in enumerate(self.get_runs(point)):
+                if max_part is None or count > max_part.count:
+                    along = start[1] if d == 0 else start[0]
+                    max_part = Partition(player, count, along, along + count - 1, start, end)
+
+        return max_part
 
 
 class GUIBoard(Board):
-    def __init__(self, size, verbose=False, background='wood.jpg'):
+    def __init__(self, size, verbose=False, background='wood.jpg', fps=None):
         """
         It's a graphical user interface including show the board with squares and show stones with circles,
-        it also can detect mouse click on board
+        it also can detect mouse click on board. The grid, the font and the stone of each player are rendered once
+        and only changed areas of the screen are updated. fps turns on the spectator mode, the screen is updated
+        at most fps times per second, so fast bot games aren't slowed down by rendering.
         """
         super().__init__(size, verbose)
 
@@ -117,15 +648,23 @@ class GUIBoard(Board):
         self._screen = pygame.display.set_mode((self._board_size, self._board_size + BOTTOM_SIZE), 0, 32)
         self._background = pygame.image.load('images/' + background).convert()
         self._outline = pygame.Rect(BOARD_PADDING, BOARD_PADDING, BOX_SIZE * (size - 1), BOX_SIZE * (size - 1))
-
-    def draw(self):
-        pygame.draw.rect(self._background, (0, 0, 0), self._outline, width=3)
+        self._grid_surface = self._render_grid()
         self._outline.inflate_ip(20, 20)
+        self._font = None
+        self._texts = {}
+        self._sprites = {}
+        self._fps = fps
+        self._dirty = []
+        self._flushed = 0
+
+    def _render_grid(self):
+        surface = self._background.copy()
+        pygame.draw.rect(surface, (0, 0, 0), self._outline, width=3)
 
         for i in range(self._size - 1):
             for j in range(self._size - 1):
                 rect = pygame.Rect(BOARD_PADDING + (BOX_SIZE * i), BOARD_PADDING + (BOX_SIZE * j), BOX_SIZE, BOX_SIZE)
-                pygame.draw.rect(self._background, (0, 0, 0), rect, 1)
+                pygame.draw.rect(surface, (0, 0, 0), rect, 1)
 
         dots = math.floor((self._size - 2) / 3)
         for i in range(dots):
@@ -133,25 +672,73 @@ class GUIBoard(Board):
                 coords = (
                     BOARD_PADDING + BOX_SIZE * 3 + (BOX_SIZE * 3 * i),
                     BOARD_PADDING + BOX_SIZE * 3 + (BOX_SIZE * 3 * j))
-                pygame.draw.circle(self._background, (0, 0, 0), coords, 5, 0)
-        self._screen.blit(self._background, (0, 0))
+                pygame.draw.circle(surface, (0, 0, 0), coords, 5, 0)
+        return surface
+
+    def _sprite(self, player):
+        sprite = self._sprites.get(player)
+        if sprite is None:
+            sprite = pygame.Surface((BOX_SIZE, BOX_SIZE), pygame.SRCALPHA)
+            center = (BOX_SIZE // 2, BOX_SIZE // 2)
+            pygame.draw.circle(sprite, player.border_color, center, int(BOX_SIZE / 2) - 3, 0)
+            pygame.draw.circle(sprite, player.color, center, int(BOX_SIZE / 2) - 7, 0)
+            self._sprites[player] = sprite
+        return sprite
+
+    def _text(self, message):
+        text = self._texts.get(message)
+        if text is None:
+            if self._font is None:
+                self._font = pygame.font.Font('fonts/Chalkduster.ttf', 64)
+            if len(self._texts) > 64:
+                self._texts.clear()
+            text = self._texts[message] = self._font.render(message, True, (0, 0, 0))
+        return text
+
+    def _update(self, rect):
+        """Mark the area as changed and update the screen, in spectator mode it waits for the next frame"""
+        self._dirty.append(rect)
+        self.flush()
+
+    def flush(self, force=False):
+        """Update the changed areas of the screen, in spectator mode only if a frame is due or force is on"""
+        now = time.perf_counter()
+        if not self._dirty or not force and self._fps and now - self._flushed < 1 / self._fps:
+            return
+
+        pygame.display.update(self._dirty)
+        self._dirty = []
+        self._flushed = now
+        if self._fps and pygame.event.peek(pygame.QUIT):
+            print('Program closed')
+            exit()
 
+    def draw(self):
+        self._screen.blit(self._grid_surface, (0, 0))
+        for stone in self.history:
+            self._draw_stone(stone.pos, stone.owner)
+
+        self._dirty = []
         pygame.display.update()
-        pygame.time.wait(250)
-        pygame.event.get()
+        pygame.event.pump()
+
+    def _draw_stone(self, point, player):
+        row, col = point
+        left = col * BOX_SIZE + BOARD_PADDING - BOX_SIZE // 2
+        top = row * BOX_SIZE + BOARD_PADDING - BOX_SIZE // 2
+        rect = pygame.Rect(left, top, BOX_SIZE, BOX_SIZE)
+        self._screen.blit(self._sprite(player), rect)
+        return rect
 
     def put_stone(self, point, player):
         result = super().put_stone(point, player)
         if result:
-            row, col = point
-            coords = (col * BOX_SIZE + BOARD_PADDING, row * BOX_SIZE + BOARD_PADDING)
-            pygame.draw.circle(self._screen, player.border_color, coords, int(BOX_SIZE / 2) - 3, 0)
-            pygame.draw.circle(self._screen, player.color, coords, int(BOX_SIZE / 2) - 7, 0)
-            pygame.display.update()
+            self._update(self._draw_stone(point, player))
 
         return result
 
     def rest(self, delay):
+        self.flush(force=True)
         pygame.time.wait(int(delay * 100))
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
@@ -182,13 +769,14 @@ class GUIBoard(Board):
 
         x, y = partition.end
         end = (y * BOX_SIZE + BOARD_PADDING, x * BOX_SIZE + BOARD_PADDING)
-        pygame.draw.line(self._screen, (0, 255, 0), start, end, 5)
-        pygame.display.update()
+        self._update(pygame.draw.line(self._screen, (0, 255, 0), start, end, 5))
 
         self.show_message(player.title + ' win')
+        self.flush(force=True)
 
     def show_draw(self):
         self.show_message('DRAW')
+        self.flush(force=True)
 
     def show_message(self, message):
         top = self._board_size - 25
@@ -196,8 +784,7 @@ class GUIBoard(Board):
         area_rect = pygame.Rect(blit_coords, (self._board_size, 70))
         self._screen.blit(self._background, blit_coords, area_rect)
 
-        font = pygame.font.Font('fonts/Chalkduster.ttf', 64)
-        img = font.render(message, True, (0, 0, 0))
+        img = self._text(message)
         self._screen.blit(img, ((self._board_size - img.get_width()) / 2, top))
-        pygame.display.update()
+        self._update(area_rect)
         super().show_message(message)
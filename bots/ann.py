@@ -1,40 +1,56 @@
 import numpy as np
 from player import Player
 from board import Board
-from keras.models import load_model
-
-SIZE = 13
+from observation import Observation
+from inference import InferenceServer
+from cache import EvaluationCache
+from utils import canonical_hash
 
 
 class ANN(Player):
-    def __init__(self, title, color):
-        """Random AI player"""
+    def __init__(self, title, color, model_path='bots/ann.h5', cache_size=2 ** 12):
+        """
+        Neural network player, every ANN with the same model file shares one InferenceServer,
+        so the model is loaded once and moves of concurrent games are evaluated in batches.
+        Heatmaps are cached by the canonical hash of the observation in a cache of the model that every ANN
+        shares as well, so rotations and reflections of a position, from any seat and game, are evaluated once.
+        """
         super().__init__(title, color)
-        self.model = load_model('bots/ann.h5')
+        self.server = InferenceServer.of(model_path)
+        self.observation = Observation(planes=self.server.input_shape[-1])
+        self.cache = EvaluationCache.of(model_path, cache_size)
+        self._planes = np.arange(1, self.observation.planes + 1)
 
     def get_state(self, board):
-        state = np.zeros((SIZE, SIZE, 2), dtype=int)
-        for r, row in enumerate(board.map):
-            for c, cell in enumerate(row):
-                if cell is not None:
-                    key = 0 if cell.owner == self else 1
-                    state[r, c, key] = 1
-
-        return state
+        return self.observation.encode(board, self, self._rivals)
+
+    def evaluate(self, board: Board):
+        """Heatmap of the model for the board, it's a new array that can be changed"""
+        state = self.get_state(board)
+        # Stones by plane of the observation, so the key doesn't depend on the order of players on the board
+        key, transform = canonical_hash((state * self._planes).sum(axis=-1))
+        key = (key, board.size)
+        canonical = self.cache.get(key)
+        if canonical is None:
+            heatmap = self.server.evaluate(state).reshape(-1)
+            self.cache.put(key, board.symmetries.apply(heatmap, transform))
+            return heatmap
+
+        return canonical[board.symmetries.maps[transform]]
 
     def play(self, board: Board):
-        state = self.get_state(board).reshape((1, 1, SIZE, SIZE, 2))
-        heatmap = self.model.predict(state, verbose=0).reshape(-1)
+        size = board.size
+        heatmap = self.evaluate(board)
 
         while board.has_empty_cell:
             action = heatmap.argmax()
-            row = action // SIZE
-            col = action % SIZE
+            row = action // size
+            col = action % size
 
             while not board.is_empty((row, col)):
                 heatmap[action] = -np.Inf
                 action = heatmap.argmax()
-                row = action // SIZE
-                col = action % SIZE
+                row = action // size
+                col = action % size
 
             yield row, col
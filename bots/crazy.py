@@ -1,4 +1,5 @@
 import random
+import numpy as np
 from player import Player
 from game import Game
 from board import Board
@@ -6,15 +7,20 @@ from board import Board
 
 class CrazyAI(Player):
     def __init__(self, title, color):
-        """Random AI player"""
+        """Random AI player, it picks from the candidates once most of the board is filled or on an unbounded board"""
         super().__init__(title, color)
 
     def play(self, board: Board):
         while board.has_empty_cell:
+            if board.size is None or board.empty_count * 4 < board.size * board.size:
+                candidates = board.candidates()
+                if len(candidates):
+                    choice = candidates[random.randrange(len(candidates))]
+                    yield tuple(int(value) for value in choice) if np.ndim(choice) else divmod(int(choice), board.size)
+                    continue
+
             row = random.randint(0, board.size - 1)
             col = random.randint(0, board.size - 1)
 
             if board.is_empty((row, col)):
                 yield row, col
-
-
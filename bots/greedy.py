@@ -1,107 +1,310 @@
 import random
 import numpy as np
-from collections import deque
 from player import Player
 from game import Game
-from board import Board
-from typing import Optional, List
-from stone import Stone
+from board import Board, SparseBoard, DIRECTIONS
+from utils import Utils, OFF_BOARD
 
 
 class Greedy(Player):
-    def __init__(self, title, color):
-        """Greedy AI player"""
+    def __init__(self, title, color, incremental=True, solver=None):
+        """
+        Greedy AI player, it keeps scores of lines between turns and if incremental is on,
+        only lines through the stones placed since its last turn are scanned again.
+        solver is a ThreatSolver that looks for a forced win before the scores are used on a dense board,
+        with Clock it takes up to half of the time of the stone.
+        """
         super().__init__(title, color)
         self.stone_each_turn = 2
         self.win = 6
         self.size = 13
         self.scores = np.zeros((13, 13))
+        self.incremental = incremental
+        self.solver = solver
+        self._board = None
+        self._players = ()
+        self._synced = 0
+        self._last_stone = None
 
     def prepare(self, board: Board, game: Game):
         super().prepare(board, game)
         self.win = game.win
-        self.size = board.size
-        self.scores = np.zeros((board.size, board.size))
         self.stone_each_turn = game.stone_each_turn
+        if isinstance(board, SparseBoard):
+            return
 
-
-    def max_possibilities(self, line: List[Optional[Stone]], player: Player, stone_counts: int, return_all: bool = False):
-        start_range = 0
-        remains = stone_counts
-        fill_cells = deque()
-        actions = deque()
-
-        for j, cell in enumerate(line):
-            if cell is None:
-                if remains > 0:
-                    remains -= 1
-                else:
-                    actions.append((j - start_range, fill_cells.copy(), stone_counts))
-                    start_range = fill_cells.popleft() + 1
-
-                fill_cells.append(j)
-
-            elif cell.owner != player:
-                if len(fill_cells):
-                    actions.append((j - start_range, fill_cells.copy(), stone_counts - remains))
-
-                fill_cells.clear()
-                start_range = j + 1
-                remains = stone_counts
-
-        if len(fill_cells):
-            actions.append((len(line) - start_range, fill_cells.copy(), stone_counts - remains))
-
-
+        self.size = board.size
+        self.scores = np.zeros((board.size, board.size))
+        self._board = None
+
+
+    @staticmethod
+    def possibilities(line: np.ndarray, player: int, stone_counts: int):
+        """
+        Vectorized scan of ranges of the line that the player can own by filling at most stone_counts empty cells.
+        Each range is bounded by rival stones, the line ends or the empty cells right before and after
+        its filled cells. It returns length of the ranges, a matrix of their filled cells padded with -1
+        and the number of filled cells of each range, in the order of the ranges along the line.
+        """
+        length = len(line)
+        positions = np.arange(length)
+        blocked = (line != 0) & (line != player)
+        empties = np.flatnonzero(line == 0)
+
+        range_start = np.maximum.accumulate(np.where(blocked, positions, -1))[empties] + 1
+        range_end = np.flip(np.minimum.accumulate(np.flip(np.where(blocked, positions, length))))[empties] - 1
+
+        block = np.cumsum(blocked)[empties]
+        first = np.searchsorted(block, block, side='left')
+        last = np.searchsorted(block, block, side='right') - 1
+
+        index = np.arange(len(empties))
+        starts = index <= np.maximum(first, last - stone_counts + 1)
+        index, first, last = index[starts], first[starts], last[starts]
+        range_start, range_end = range_start[starts], range_end[starts]
+
+        used = np.minimum(stone_counts, last - index + 1)
+        after = index + stone_counts
+        range_start = np.where(index > first, empties[np.maximum(index - 1, 0)] + 1, range_start)
+        range_end = np.where(after <= last, empties[np.minimum(after, len(empties) - 1)] - 1, range_end)
+
+        fills = index[:, None] + np.arange(stone_counts)
+        fills = np.where(fills <= last[:, None], empties[np.minimum(fills, len(empties) - 1)], -1)
+        return range_end - range_start + 1, fills, used
+
+    def max_possibilities(self, line: np.ndarray, player: int, stone_counts: int, return_all: bool = False):
+        """
+        Find the longest ranges of the line that the player can own by filling at most stone_counts empty cells,
+        line is a slice of board grid and player is the index of the player on the board
+        """
+        lengths, fills, used = self.possibilities(line, player, stone_counts)
         if return_all:
-            return actions
+            return [(length, cells[:count], count) for length, cells, count in zip(
+                lengths.tolist(), fills.tolist(), used.tolist())]
 
-        if len(actions):
-            max_len, _, _ = max(actions, key=lambda x: x[0])
-            max_action = filter(lambda x: x[0] == max_len, actions)
-            max_action = map(lambda x: list(x[1]), max_action)
-            return max_len, list(max_action)
+        if len(lengths):
+            max_len = lengths.max()
+            max_action = [cells[:count] for cells, count in zip(
+                fills[lengths == max_len].tolist(), used[lengths == max_len].tolist())]
+            return int(max_len), max_action
 
         return 0, []
 
-
-    def play(self, board: Board):
-        self.scores[:, :] = np.random.normal(size=(self.size, self.size)) - 3
-
-        for x, y in board.utils.get_every_lines_indexes():
-            if len(x) >= self.win:
-                self.scores[x, y] += 1
-                max_len, actions = self.max_possibilities(board.map[x, y], self, self.stone_each_turn)
+    def line_vicinity(self, values: np.ndarray, player: int, stone_counts: int):
+        """
+        Count stones of the player in each range of the lines, that it can own by filling at most stone_counts
+        empty cells, and add it to the score of the filled cells. values are rows of Utils.line_values, they are
+        scanned as one array where lines are separated by an off board cell. It returns the scores with
+        the same shape as values.
+        """
+        lines, size = values.shape
+        flat = np.concatenate((values, np.full((lines, 1), OFF_BOARD, dtype=values.dtype)), axis=1).reshape(-1)
+        lengths, fills, used = self.possibilities(flat, player, stone_counts)
+
+        vicinity = lengths - used
+        fills = fills[vicinity > 0]
+        vicinity = np.broadcast_to(vicinity[vicinity > 0, None], fills.shape)
+        filled = fills >= 0
+
+        scores = np.bincount(fills[filled], weights=vicinity[filled], minlength=lines * (size + 1))
+        return scores.reshape(lines, size + 1)[:, :size].astype(np.int64)
+
+    def refresh(self, board: Board, me: int, rivals):
+        """
+        Update the threat flags and vicinity scores of every line, only lines through stones that are placed since
+        the last call are scanned again, unless the board or the players are changed or incremental is off
+        """
+        self.refresh_many([(self, board, me, rivals)])
+
+    @staticmethod
+    def refresh_many(items):
+        """
+        refresh of several Greedy players at once, items are (greedy, board, me, rivals), e.g. the rivals of
+        concurrent games. Lines of boards with the same size and players are scanned as one array.
+        """
+        groups = {}
+        for greedy, board, me, rivals in items:
+            line_ids = greedy._changed_lines(board, me, rivals)
+            if len(line_ids):
+                key = (board.size, greedy._players, greedy.win, greedy.stone_each_turn)
+                values = board.utils.cells[board.utils.tables.matrix[line_ids]]
+                groups.setdefault(key, []).append((greedy, board, line_ids, values))
+
+        for (_, players, _, _), group in groups.items():
+            greedy, board = group[0][:2]
+            values = np.concatenate([values for _, _, _, values in group])
+            me, rivals = players[0], players[1:]
+            scores = greedy.line_vicinity(values, me, greedy.win - 1)
+            threats = [greedy.can_complete(board, values, me)]
+            for rival in rivals:
+                scores += greedy.line_vicinity(values, rival, greedy.win - 2)
+                threats.append(greedy.can_complete(board, values, rival))
+
+            splits = np.cumsum([len(line_ids) for _, _, line_ids, _ in group])[:-1]
+            threats = np.split(np.array(threats), splits, axis=1)
+            for (greedy, _, line_ids, _), line_scores, line_threats in zip(group, np.split(scores, splits), threats):
+                greedy._store(line_ids, line_scores, line_threats)
+
+    def _changed_lines(self, board: Board, me: int, rivals):
+        """Ids of the long lines to scan again, every long line after a reset of the scores"""
+        tables = board.utils.tables
+        history = board.history
+        players = (me, *rivals)
+        synced = self._synced
+        full = (not self.incremental or board is not self._board or players != self._players or
+                len(history) < synced or (synced and history[synced - 1] is not self._last_stone))
+
+        if full:
+            self._board = board
+            self._players = players
+            self._long_lines = tables.lengths >= self.win
+            self._lines = np.bincount(tables.matrix[self._long_lines].reshape(-1), minlength=self.size * self.size + 1)
+            self._threats = np.zeros((len(players), len(tables.lines)), dtype=bool)
+            self._line_scores = np.zeros((len(tables.lines), self.size), dtype=np.int64)
+            self._vicinity = np.zeros(self.size * self.size + 1, dtype=np.int64)
+            line_ids = np.flatnonzero(self._long_lines)
+        else:
+            points = np.array([stone.pos for stone in history[synced:]], dtype=np.intp).reshape(-1, 2)
+            line_ids = np.unique(tables.cell_lines[points[:, 0], points[:, 1]])
+            line_ids = line_ids[self._long_lines[line_ids]]
+
+        self._synced = len(history)
+        self._last_stone = history[-1] if history else None
+        return line_ids
+
+    def _store(self, line_ids, scores, threats):
+        matrix = self._board.utils.tables.matrix[line_ids]
+        self._threats[:, line_ids] = threats
+        np.subtract.at(self._vicinity, matrix, self._line_scores[line_ids])
+        np.add.at(self._vicinity, matrix, scores)
+        self._line_scores[line_ids] = scores
+
+    def can_complete(self, board: Board, values: np.ndarray, player: int):
+        """Find lines that the player may complete with stone_each_turn stones, from one pass over their ranges"""
+        own, rival, empty = board.utils.count_windows(values, player, self.win)
+        return ((rival == 0) & (empty <= self.stone_each_turn)).any(axis=1)
+
+    def forced_actions(self, board: Board, me: int, rivals):
+        """Complete own lines that can win this turn and block lines of rivals that can win in their turn"""
+        line_id = -1
+        while True:
+            flagged = np.flatnonzero(self._threats[:, line_id + 1:].any(axis=0))
+            if not len(flagged):
+                break
+
+            line_id += 1 + flagged[0]
+            x, y = board.utils.tables.lines[line_id]
+
+            if self._threats[0, line_id]:
+                max_len, actions = self.max_possibilities(board.grid[x, y], me, self.stone_each_turn)
 
                 if max_len >= self.win:
                     for point in actions[0]:
                         yield x[point], y[point]
+                        self.refresh(board, me, rivals)
 
-                actions = self.max_possibilities(board.map[x, y], self, self.win - 1, return_all=True)
-                for max_len, points, stone_used in actions:
-                    vicinity_count = max_len - stone_used
-                    if vicinity_count > 0:
-                        self.scores[x[points], y[points]] += vicinity_count
-
-
-                for rival in self._rivals:
-                    max_len, actions = self.max_possibilities(board.map[x, y], rival, self.stone_each_turn)
+            for i, rival in enumerate(rivals):
+                if self._threats[i + 1, line_id]:
+                    max_len, actions = self.max_possibilities(board.grid[x, y], rival, self.stone_each_turn)
 
                     while max_len >= self.win:
                         acts = np.array(actions).reshape(-1)
                         unique, counts = np.unique(acts, return_counts=True)
                         point = unique[counts.argmax()]
                         yield x[point], y[point]
+                        self.refresh(board, me, rivals)
+
+                        max_len, actions = self.max_possibilities(board.grid[x, y], rival, self.stone_each_turn)
+
+    def segments(self, board: SparseBoard, points):
+        """
+        Values and cells of the segments through each point of a sparse board in every direction,
+        with win - 1 cells on each side, so they cover every range with length win through the points
+        """
+        steps = np.arange(1 - self.win, self.win)
+        cells = points[:, None, None, :] + steps[None, None, :, None] * np.array(DIRECTIONS)[None, :, None, :]
+        return board.values(cells), cells
+
+    def sparse_forced_action(self, board: SparseBoard, me: int, rivals):
+        """
+        Cells that complete an own line or a cell that blocks a line of a rival, from the segments through
+        the candidates. Every range that can be completed has an empty cell next to a stone, which is a candidate.
+        """
+        values, cells = self.segments(board, board.candidates())
+        values = values.reshape(-1, values.shape[-1])
+        cells = cells.reshape(-1, values.shape[-1], 2)
+
+        for side, player in enumerate((me, *rivals)):
+            own, rival, empty = Utils.count_windows(values, player, self.win)
+            for segment in np.flatnonzero(((rival == 0) & (empty <= self.stone_each_turn)).any(axis=1)):
+                max_len, actions = self.max_possibilities(values[segment], player, self.stone_each_turn)
+                if max_len < self.win:
+                    continue
+
+                if side == 0:
+                    return [tuple(cells[segment, point]) for point in actions[0]]
+
+                unique, counts = np.unique(np.array(actions).reshape(-1), return_counts=True)
+                return [tuple(cells[segment, unique[counts.argmax()]])]
+
+        return None
+
+    def play_sparse(self, board: SparseBoard):
+        """
+        Greedy play over the neighborhoods of the stones of a sparse board, the candidates are scored by
+        the ranges of the segments through them, in the same way as lines of a dense board
+        """
+        me = board.player_index(self)
+        rivals = [board.player_index(rival) for rival in self._rivals]
+
+        while True:
+            action = self.sparse_forced_action(board, me, rivals)
+            if action is None:
+                break
+            for point in action:
+                yield point
+
+        points = board.candidates()
+        values, _ = self.segments(board, points)
+        flat = values.reshape(-1, values.shape[-1])
+        center = self.win - 1
+        scores = self.line_vicinity(flat, me, self.win - 1)[:, center]
+        for rival in rivals:
+            scores += self.line_vicinity(flat, rival, self.win - 2)[:, center]
+
+        lines = ((values != OFF_BOARD).sum(axis=2) >= self.win).sum(axis=1)
+        scores = np.random.normal(size=len(points)) - 3 + lines + scores.reshape(len(points), -1).sum(axis=1)
+
+        for i in np.argsort(-scores, kind='stable'):
+            point = tuple(points[i])
+            if board.is_empty(point):
+                yield point
 
-                        max_len, actions = self.max_possibilities(board.map[x, y], rival, self.stone_each_turn)
+        while board.has_empty_cell:
+            for point in board.candidates():
+                yield tuple(point)
+
+    def play(self, board: Board):
+        if isinstance(board, SparseBoard):
+            yield from self.play_sparse(board)
+            return
 
+        noise = np.random.normal(size=self.size * self.size)
+        me = board.player_index(self)
+        rivals = [board.player_index(rival) for rival in self._rivals]
 
-                    actions = self.max_possibilities(board.map[x, y], rival, self.win - 2, return_all=True)
-                    for max_len, points, stone_used in actions:
-                        vicinity_count = max_len - stone_used
-                        if vicinity_count > 0:
-                            self.scores[x[points], y[points]] += vicinity_count
+        if self.solver is not None:
+            stones = self.solver.solve(board, self, self._rivals, self.win, self.stone_each_turn,
+                                       deadline=self.solver_deadline())
+            for point in stones or ():
+                yield point
 
+        self.refresh(board, me, rivals)
+        for point in self.forced_actions(board, me, rivals):
+            yield point
+
+        scores = noise - 3 + (self._lines + self._vicinity)[:-1]
+        self.scores[:, :] = scores.reshape(self.size, self.size)
 
         while board.has_empty_cell:
             max_index = self.scores.argmax()
@@ -110,8 +313,3 @@ class Greedy(Player):
             self.scores[row, col] = -np.Inf
             if board.is_empty((row, col)):
                 yield row, col
-
-
-
-
-
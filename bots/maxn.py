@@ -0,0 +1,187 @@
+import numpy as np
+from player import Player
+from bots.search import AlphaBeta
+
+MODES = ('maxn', 'paranoid', 'brs')
+# Seat of a best-reply node, where any rival may start its turn
+ANY = -1
+
+
+class MaxN(AlphaBeta):
+    def __init__(self, title, color, mode='brs', time_limit=1., max_depth=6, width=8, solver=None):
+        """
+        Iterative deepening search for any number of players, on the scratch board and deepening of AlphaBeta.
+        Positions are evaluated as a vector of the share of every seat, from the ranges with length win that
+        only that seat holds, weighted by its stones there. The vector is kept up to date by each stone in one
+        pass over the ranges through its cell. mode picks the reduction of the rivals: 'maxn' lets every seat
+        maximize its own share with shallow pruning, 'paranoid' searches the rivals as one side that minimizes
+        the share of the player with alpha-beta, and 'brs' (best-reply search) plays only the best turn of any
+        one rival between the turns of the player, with alpha-beta, so the depth reaches the next turns of the
+        player whatever the number of players. It has no transposition table and doesn't ponder.
+        """
+        if mode not in MODES:
+            raise ValueError('mode has to be one of %s' % ', '.join(MODES))
+
+        super().__init__(title, color, time_limit, max_depth, width, table_size=1, solver=solver)
+        self.mode = mode
+
+    ponder = Player.ponder
+
+    def _count(self, values):
+        """Count stones of every seat in the ranges, values are the cells of every range"""
+        self._counts = np.zeros((len(self._seats), len(values) + 1), dtype=np.intp)
+        for seat, player in enumerate(self._seats):
+            self._counts[seat, :-1] = (values == self._scratch.player_index(player)).sum(axis=1)
+        self._totals = self._counts.sum(axis=0)
+        self._scores = self._vector(slice(None))
+        self._history = []
+
+    def _vector(self, windows):
+        """Score of every seat in the ranges, a range counts only for the seat that holds all of its stones"""
+        counts = self._counts[:, windows]
+        return (self._weights[counts] * (counts == self._totals[windows])).sum(axis=1)
+
+    def _make(self, cell, seat):
+        """Push a stone of the seat on the scratch board and return True if it wins"""
+        windows = self._cell_windows[cell]
+        before = self._vector(windows)
+        self._counts[seat, windows] += 1
+        self._totals[windows] += 1
+        self._counts[seat, -1] = self._totals[-1] = 0
+
+        self._history.append(self._scores)
+        self._scores = self._scores + self._vector(windows) - before
+        return self._scratch.push(divmod(cell, self._size), self._seats[seat]) >= self.win
+
+    def _unmake(self, cell, seat):
+        windows = self._cell_windows[cell]
+        self._counts[seat, windows] -= 1
+        self._totals[windows] -= 1
+        self._counts[seat, -1] = self._totals[-1] = 0
+        self._scores = self._history.pop()
+        self._scratch.pop()
+
+    def _utility(self):
+        """Shares of the seats that sum to one, so shallow pruning can bound the share of the others"""
+        total = self._scores.sum()
+        if not total:
+            return np.full(len(self._seats), 1 / len(self._seats))
+        return self._scores / total
+
+    def _ordered(self, first=None, seat=0):
+        """Empty candidates ordered by what a stone of the seat adds to its ranges and takes from rival ranges"""
+        moves = self._scratch.candidates()
+        if not len(moves):
+            return []
+
+        windows = self._cell_windows[moves]
+        counts = self._counts[:, windows]
+        live = counts == self._totals[windows]
+        weights = self._weights
+        own = np.where(live[seat], weights[counts[seat] + 1] - weights[counts[seat]], 0)
+        taken = np.where(live, weights[counts], 0).sum(axis=0) - np.where(live[seat], weights[counts[seat]], 0)
+        gains = ((own + taken) * (windows < self._window_count)).sum(axis=1)
+        moves = moves[np.argsort(-gains, kind='stable')].tolist()
+
+        if first is not None and first in moves:
+            moves.remove(first)
+            moves.insert(0, first)
+        return moves
+
+    def _next_turn(self, seat, left):
+        if self.mode == 'brs' and left == 1:
+            return (ANY if seat == 0 else 0), self.stone_each_turn
+        return super()._next_turn(seat, left)
+
+    def _maxn(self, depth, seat, left, bound):
+        """
+        Utility vector of the position for the seat to move, every seat maximizes its own share. Shares sum to one,
+        so once the seat reaches bound, the rest of the seats can't beat what the seat of the parent already has.
+        """
+        self._tick()
+        if depth == 0:
+            return self._utility()
+
+        moves = self._ordered(seat=seat)[:self.width]
+        if not moves:
+            return np.full(len(self._seats), 1 / len(self._seats))
+
+        next_seat, next_left = self._next_turn(seat, left)
+        best = None
+        for cell in moves:
+            if self._make(cell, seat):
+                value = np.zeros(len(self._seats))
+                value[seat] = 1
+            elif not self._scratch.has_empty_cell:
+                value = np.full(len(self._seats), 1 / len(self._seats))
+            else:
+                child_bound = 1 - best[seat] if best is not None and next_seat != seat else np.inf
+                value = self._maxn(depth - 1, next_seat, next_left, child_bound)
+            self._unmake(cell, seat)
+
+            if best is None or value[seat] > best[seat]:
+                best = value
+            if best[seat] >= min(bound, 1):
+                break
+
+        return best
+
+    def _alphabeta(self, depth, alpha, beta, seat, left):
+        """Share of the player, which the rivals minimize together, or by the best reply of one rival with brs"""
+        self._tick()
+        if depth == 0:
+            return self._utility()[0]
+
+        if seat == ANY:
+            moves = [(rival, cell) for rival in range(1, len(self._seats))
+                     for cell in self._ordered(seat=rival)[:self.width]]
+        else:
+            moves = [(seat, cell) for cell in self._ordered(seat=seat)[:self.width]]
+        if not moves:
+            return 1 / len(self._seats)
+
+        maximizing = seat == 0
+        best = -np.inf if maximizing else np.inf
+        for mover, cell in moves:
+            if self._make(cell, mover):
+                value = 1. if maximizing else 0.
+            elif not self._scratch.has_empty_cell:
+                value = 1 / len(self._seats)
+            else:
+                next_seat, next_left = self._next_turn(mover, left)
+                value = self._alphabeta(depth - 1, alpha, beta, next_seat, next_left)
+            self._unmake(cell, mover)
+
+            if maximizing:
+                best = max(best, value)
+                alpha = max(alpha, best)
+            else:
+                best = min(best, value)
+                beta = min(beta, best)
+            if alpha >= beta:
+                break
+
+        return best
+
+    def _root(self, depth, moves, left):
+        next_seat, next_left = self._next_turn(0, left)
+        best, best_move = -np.inf, moves[0]
+        for cell in moves:
+            if self._make(cell, 0):
+                value = 1.
+            elif not self._scratch.has_empty_cell:
+                value = 1 / len(self._seats)
+            elif self.mode == 'maxn':
+                bound = 1 - best if next_seat != 0 and best > -np.inf else np.inf
+                value = self._maxn(depth - 1, next_seat, next_left, bound)[0]
+            else:
+                value = self._alphabeta(depth - 1, best, np.inf, next_seat, next_left)
+            self._unmake(cell, 0)
+
+            if value > best:
+                best, best_move = value, cell
+
+        return best, best_move
+
+    def _solved(self, value):
+        return value >= 1
@@ -0,0 +1,241 @@
+import math
+import time
+import numpy as np
+from player import Player, DEADLINE_MARGIN
+from game import Game
+from board import Board, DIRECTIONS
+
+
+class Node(object):
+    __slots__ = ('move', 'seat', 'left', 'winner', 'children', 'untried', 'visits', 'values')
+
+    def __init__(self, move, seat, left, players, winner=None):
+        """
+        A position in the search tree. move is the flat cell of the stone that led to it, seat and left
+        refer to the seat to move and its remaining stones in the turn, values is the sum of rollout results
+        of each seat. winner is the seat that won with move, if any.
+        """
+        self.move = move
+        self.seat = seat
+        self.left = left
+        self.winner = winner
+        self.children = {}
+        self.untried = None
+        self.visits = 0
+        self.values = np.zeros(players)
+
+
+class MCTS(Player):
+    def __init__(self, title, color, time_limit=1., rollouts=64, rollout_stones=80, exploration=1.4, seed=None):
+        """
+        Monte Carlo tree search with UCT, one stone per tree level and the seat to move changes after
+        stone_each_turn stones, so it works for any number of players. Each leaf is evaluated by a batch of
+        random rollouts that are played together on a stacked array of boards. The tree is reused between moves
+        by following the stones placed since the last search. time_limit is the budget in seconds for each stone,
+        it's cut to the deadline of the clock of Game. While pondering, the tree of the turn of the next rival grows.
+        """
+        super().__init__(title, color)
+        self.time_limit = time_limit
+        self.rollouts = rollouts
+        self.rollout_stones = rollout_stones
+        self.exploration = exploration
+        self.win = 6
+        self.stone_each_turn = 2
+        self._rng = np.random.default_rng(seed)
+        self._board = None
+        self._scratch = None
+        self._root = None
+        self._root_moves = []
+
+    def prepare(self, board: Board, game: Game):
+        super().prepare(board, game)
+        self.win = game.win
+        self.stone_each_turn = game.stone_each_turn
+
+    def _follow(self, board: Board):
+        if self._board is not board:
+            self._board = board
+            self._scratch = Board(board.size, silent=True)
+            self._root = None
+            for player in board.players[1:]:
+                self._scratch.player_index(player)
+
+        self._scratch.follow(board)
+
+    def _next_turn(self, seat, left):
+        if left > 1:
+            return seat, left - 1
+        return (seat + 1) % len(self._seats), self.stone_each_turn
+
+    def _reuse(self, board: Board, left, seat=0):
+        """Move the root down along the stones placed since the last search, or start a new tree"""
+        moves = [stone.pos[0] * board.size + stone.pos[1] for stone in board.history]
+        root = self._root
+        if root is not None and moves[:len(self._root_moves)] == self._root_moves:
+            for move in moves[len(self._root_moves):]:
+                root = root.children.get(move)
+                if root is None:
+                    break
+
+        if root is None or root.seat != seat or root.left != left or root.winner is not None:
+            root = Node(None, seat, left, len(self._seats))
+
+        self._root = root
+        self._root_moves = moves
+
+    def _candidates(self, seat):
+        """
+        Candidates of the scratch board, that are empty cells near stones. They are ordered by the longest run
+        a stone there makes for the seat to move or blocks for a rival, so the tree expands threats first,
+        ties are broken randomly. The list is popped from the end.
+        """
+        scratch = self._scratch
+        size = scratch.size
+        candidates = self._rng.permutation(scratch.candidates()).tolist()
+        runs = []
+        for cell in candidates:
+            point = divmod(cell, size)
+            best = 0
+            for other, player in enumerate(self._seats):
+                run = scratch.push(point, player)
+                scratch.pop()
+                # Own runs come before blocking a rival run of the same length
+                best = max(best, 2 * run + (other == seat))
+            runs.append(best)
+
+        return [candidates[i] for i in np.argsort(runs, kind='stable')]
+
+    def _select(self, node):
+        log = math.log(node.visits)
+        best, best_child = -np.inf, None
+        for child in node.children.values():
+            score = child.values[node.seat] / child.visits + self.exploration * math.sqrt(log / child.visits)
+            if score > best:
+                best, best_child = score, child
+        return best_child
+
+    def _iterate(self):
+        """Select a leaf, expand it by one stone, evaluate it with a batch of rollouts and back up the results"""
+        scratch = self._scratch
+        node = self._root
+        path = [node]
+        while node.winner is None and node.untried is not None and not node.untried and node.children:
+            node = self._select(node)
+            scratch.push(divmod(node.move, scratch.size), self._seats[path[-1].seat])
+            path.append(node)
+
+        if node.winner is None and scratch.has_empty_cell:
+            if node.untried is None:
+                node.untried = self._candidates(node.seat)
+
+            if node.untried:
+                move = node.untried.pop()
+                seat, left = self._next_turn(node.seat, node.left)
+                won = scratch.push(divmod(move, scratch.size), self._seats[node.seat]) >= self.win
+                child = Node(move, seat, left, len(self._seats), node.seat if won else None)
+                node.children[move] = child
+                node = child
+                path.append(node)
+
+        if node.winner is not None:
+            values = np.zeros(len(self._seats))
+            values[node.winner] = self.rollouts
+        elif not scratch.has_empty_cell:
+            values = np.full(len(self._seats), self.rollouts / len(self._seats))
+        else:
+            values = self._rollouts(node.seat, node.left)
+
+        for _ in range(len(path) - 1):
+            scratch.pop()
+
+        for node in path:
+            node.visits += self.rollouts
+            node.values += values
+
+    def _rollouts(self, seat, left):
+        """
+        Play a batch of random games from the scratch board together. All of them follow the same turn order,
+        so each step puts one stone of the same seat on every unfinished board. It returns the sum of results
+        of each seat, a draw is shared between all seats.
+        """
+        scratch = self._scratch
+        size = scratch.size
+        count = self.rollouts
+        indexes = [scratch.player_index(player) for player in self._seats]
+        seats = np.zeros(len(scratch.players), dtype=np.int8)
+        seats[indexes] = np.arange(1, len(indexes) + 1)
+
+        # Boards are padded with win - 1 off board cells on each side, so lines through any move can be gathered
+        pad = self.win - 1
+        width = size + 2 * pad
+        padded = np.full((width, width), -1, dtype=np.int8)
+        padded[pad:pad + size, pad:pad + size] = seats[scratch.grid]
+        boards = np.repeat(padded.reshape(1, -1), count, axis=0)
+        steps = np.arange(-pad, pad + 1)
+        offsets = np.array([steps * (dr * width + dc) for dr, dc in DIRECTIONS])
+
+        # Each rollout plays the empty cells in its own random order
+        empties = np.flatnonzero(padded.reshape(-1) == 0)
+        stones = min(self.rollout_stones, len(empties))
+        orders = empties[np.argsort(self._rng.random((count, len(empties))), axis=1)[:, :stones]]
+
+        winners = np.full(count, -1)
+        active = np.ones(count, dtype=bool)
+        rows = np.arange(count)
+        for step in range(stones):
+            moves = orders[:, step]
+            boards[rows[active], moves[active]] = seat + 1
+
+            lines = boards[rows[:, None, None], moves[:, None, None] + offsets] == seat + 1
+            runs = (1 + np.cumprod(lines[:, :, pad - 1::-1], axis=2).sum(axis=2) +
+                    np.cumprod(lines[:, :, pad + 1:], axis=2).sum(axis=2))
+            won = active & (runs >= self.win).any(axis=1)
+            winners[won] = seat
+            active &= ~won
+            if not active.any():
+                break
+
+            seat, left = self._next_turn(seat, left)
+
+        values = np.bincount(winners[winners >= 0], minlength=len(self._seats)).astype(np.float64)
+        return values + (winners < 0).sum() / len(self._seats)
+
+    def best_move(self, board: Board, left: int):
+        """Search until time_limit and return the most visited stone of the root as a flat index"""
+        deadline = time.perf_counter() + self.time_limit
+        self._seats = [self] + list(self._rivals)
+        self._follow(board)
+        self._reuse(board, left)
+
+        while True:
+            start = time.perf_counter()
+            self._iterate()
+            now = time.perf_counter()
+            if now > deadline or self._root.untried == [] and not self._root.children:
+                break
+            # The clock is a hard limit, so stop if another iteration as long as the last one doesn't fit
+            if self.deadline is not None and 2 * now - start > self.deadline - DEADLINE_MARGIN:
+                break
+
+        if not self._root.children:
+            return self._candidates(0)[-1]
+
+        return max(self._root.children.values(), key=lambda child: child.visits).move
+
+    def ponder(self, board: Board, stop):
+        """Grow the tree of the turn of the next rival until stop is set, the next search reuses it"""
+        self._seats = [self] + list(self._rivals)
+        self._follow(board)
+        self._reuse(board, self.stone_each_turn, 1 % len(self._seats))
+        yield
+
+        while not stop.is_set() and not (self._root.untried == [] and not self._root.children):
+            self._iterate()
+            yield
+
+    def play(self, board: Board):
+        left = self.stone_each_turn
+        while board.has_empty_cell:
+            cell = self.best_move(board, left)
+            yield divmod(cell, board.size)
+            left = left - 1 if left > 1 else self.stone_each_turn
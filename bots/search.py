@@ -0,0 +1,326 @@
+import math
+import time
+import numpy as np
+from player import Player, DEADLINE_MARGIN
+from game import Game
+from board import Board
+
+WIN_SCORE = 1e9
+EXACT, LOWER, UPPER = 0, 1, 2
+
+
+class SearchTimeout(Exception):
+    pass
+
+
+class TranspositionTable(object):
+    def __init__(self, size=2 ** 18):
+        """
+        Bounded transposition table, each hash has one slot that keeps (key, depth, value, flag, move, generation).
+        A slot is replaced by the same position, a deeper search or any search of a newer generation.
+        size has to be a power of two.
+        """
+        self._mask = size - 1
+        self._slots = [None] * size
+        self.generation = 0
+
+    def get(self, key):
+        entry = self._slots[key & self._mask]
+        if entry is not None and entry[0] == key:
+            return entry
+        return None
+
+    def put(self, key, depth, value, flag, move):
+        slot = key & self._mask
+        entry = self._slots[slot]
+        if entry is None or entry[0] == key or entry[5] != self.generation or depth >= entry[1]:
+            self._slots[slot] = (key, depth, value, flag, move, self.generation)
+
+
+class AlphaBeta(Player):
+    def __init__(self, title, color, time_limit=1., max_depth=8, width=12, table_size=2 ** 18, solver=None):
+        """
+        Iterative deepening alpha-beta search over single stones, the side to move changes after
+        stone_each_turn stones. Stones are tried on a scratch board with push and pop, which is kept in sync
+        with the game board between moves. Rivals are searched as one minimizing side. Positions are kept in
+        a bounded transposition table keyed by Zobrist hash. Moves are the candidates of the board, empty cells
+        near stones, ordered by threat scores of the ranges through each cell. time_limit is the budget in seconds
+        to choose each stone, it's cut to the deadline of the clock of Game. While pondering, the position of the
+        next rival is searched and the table keeps the results for the next move. solver is a ThreatSolver that
+        looks for a forced win at the start of each turn, before the search, within half of the time of the stone.
+        """
+        super().__init__(title, color)
+        self.time_limit = time_limit
+        self.max_depth = max_depth
+        self.width = width
+        self.solver = solver
+        self.win = 6
+        self.stone_each_turn = 2
+        self._table = TranspositionTable(table_size)
+        self._turn_keys = []
+        self._nodes = 0
+        self._deadline = 0
+        self._stop = None
+        self._board = None
+        self._scratch = None
+
+    def prepare(self, board: Board, game: Game):
+        super().prepare(board, game)
+        self.win = game.win
+        self.stone_each_turn = game.stone_each_turn
+        rng = np.random.default_rng(len(game.players))
+        self._turn_keys = rng.integers(0, 2 ** 63, len(game.players) * (self.stone_each_turn + 1)).tolist()
+
+    @property
+    def nodes(self):
+        return self._nodes
+
+    def _follow(self, board: Board):
+        if self._board is not board:
+            self._board = board
+            self._scratch = Board(board.size, silent=True)
+            for player in board.players[1:]:
+                self._scratch.player_index(player)
+
+        self._scratch.follow(board)
+
+    def _setup(self, board: Board):
+        """Sync the scratch board and count stones of each side in every range with length win"""
+        self._follow(board)
+        scratch = self._scratch
+        tables = scratch.utils.tables
+        self._size = board.size
+        self._seats = [self] + list(self._rivals)
+        if len(self._turn_keys) < len(self._seats) * (self.stone_each_turn + 1):
+            rng = np.random.default_rng(len(self._seats))
+            self._turn_keys = rng.integers(0, 2 ** 63, len(self._seats) * (self.stone_each_turn + 1)).tolist()
+
+        windows = tables.windows(self.win)
+        self._window_count = len(windows)
+        self._cell_windows = tables.cell_windows(self.win)
+        self._weights = np.array([0] + [4 ** i for i in range(self.win + 1)], dtype=np.float64)
+
+        self._count(scratch.utils.cells[windows])
+
+    def _count(self, values):
+        """Count stones of each side in the ranges, values are the cells of every range"""
+        me = self._scratch.player_index(self)
+        self._counts = np.zeros((2, len(values) + 1), dtype=np.intp)
+        self._counts[0, :-1] = (values == me).sum(axis=1)
+        self._counts[1, :-1] = ((values != 0) & (values != me)).sum(axis=1)
+        self._score = float(self._value(self._counts[0], self._counts[1]).sum())
+        self._scores = []
+
+    def _value(self, mine, theirs):
+        """Score of ranges from own side, ranges with stones of both sides are worth nothing"""
+        return np.where(theirs == 0, self._weights[mine], 0) - np.where(mine == 0, self._weights[theirs], 0)
+
+    def _make(self, cell, seat):
+        """Push a stone of the seat on the scratch board and return True if it wins"""
+        side = 1 if seat else 0
+        windows = self._cell_windows[cell]
+        counts = self._counts
+        before = self._value(counts[0, windows], counts[1, windows]).sum()
+        counts[side, windows] += 1
+        counts[side, -1] = 0
+        after = self._value(counts[0, windows], counts[1, windows]).sum()
+
+        self._scores.append(self._score)
+        self._score += float(after - before)
+        return self._scratch.push(divmod(cell, self._size), self._seats[seat]) >= self.win
+
+    def _unmake(self, cell, seat):
+        side = 1 if seat else 0
+        self._counts[side, self._cell_windows[cell]] -= 1
+        self._counts[side, -1] = 0
+        self._score = self._scores.pop()
+        self._scratch.pop()
+
+    def _ordered(self, first=None):
+        """Empty candidates ordered by threats of both sides in the ranges through them"""
+        moves = self._scratch.candidates()
+        if not len(moves):
+            return []
+
+        windows = self._cell_windows[moves]
+        mine, theirs = self._counts[0, windows], self._counts[1, windows]
+        weights = self._weights
+        gains = (np.where(theirs == 0, weights[mine + 1] - weights[mine], 0) +
+                 np.where(mine == 0, weights[theirs + 1] - weights[theirs], 0))
+        gains = (gains * (windows < self._window_count)).sum(axis=1)
+        moves = moves[np.argsort(-gains, kind='stable')].tolist()
+
+        if first is not None and first in moves:
+            moves.remove(first)
+            moves.insert(0, first)
+        return moves
+
+    def _horizon(self, seat, ply):
+        """Value of the best stone of the seat among all candidates, scored at once from the ranges through them"""
+        moves = self._scratch.candidates()
+        if not len(moves):
+            return 0
+
+        windows = self._cell_windows[moves]
+        valid = windows < self._window_count
+        mine, theirs = self._counts[0, windows], self._counts[1, windows]
+        if seat:
+            wins = (valid & (mine == 0) & (theirs + 1 >= self.win)).any()
+            gains = self._value(mine, theirs + 1) - self._value(mine, theirs)
+        else:
+            wins = (valid & (theirs == 0) & (mine + 1 >= self.win)).any()
+            gains = self._value(mine + 1, theirs) - self._value(mine, theirs)
+
+        if wins:
+            return -(WIN_SCORE - ply) if seat else WIN_SCORE - ply
+
+        gains = (gains * valid).sum(axis=1)
+        return self._score + float(gains.min() if seat else gains.max())
+
+    def _next_turn(self, seat, left):
+        if left > 1:
+            return seat, left - 1
+        return (seat + 1) % len(self._seats), self.stone_each_turn
+
+    def _tick(self):
+        self._nodes += 1
+        if not self._nodes & 7 and (time.perf_counter() > self._deadline or self._stop and self._stop.is_set()):
+            raise SearchTimeout()
+
+    def _search(self, depth, alpha, beta, seat, left, ply):
+        self._tick()
+        key = self._scratch.hash ^ self._turn_keys[seat * (self.stone_each_turn + 1) + left]
+        entry = self._table.get(key)
+        first = None
+        if entry is not None:
+            _, entry_depth, value, flag, first, _ = entry
+            if entry_depth >= depth:
+                if flag == EXACT:
+                    return value
+                if flag == LOWER:
+                    alpha = max(alpha, value)
+                elif flag == UPPER:
+                    beta = min(beta, value)
+                if alpha >= beta:
+                    return value
+
+        if depth == 0:
+            return self._score
+
+        if depth == 1:
+            return self._horizon(seat, ply)
+
+        moves = self._ordered(first)[:self.width]
+        if not moves:
+            return 0
+
+        maximizing = seat == 0
+        next_seat, next_left = self._next_turn(seat, left)
+        start_alpha, start_beta = alpha, beta
+        best = -np.inf if maximizing else np.inf
+        best_move = None
+        for cell in moves:
+            if self._make(cell, seat):
+                value = (WIN_SCORE - ply) if maximizing else -(WIN_SCORE - ply)
+            elif not self._scratch.has_empty_cell:
+                value = 0
+            else:
+                value = self._search(depth - 1, alpha, beta, next_seat, next_left, ply + 1)
+            self._unmake(cell, seat)
+
+            if maximizing and value > best:
+                best, best_move = value, cell
+                alpha = max(alpha, best)
+            elif not maximizing and value < best:
+                best, best_move = value, cell
+                beta = min(beta, best)
+
+            if alpha >= beta:
+                break
+
+        if best <= start_alpha:
+            flag = UPPER
+        elif best >= start_beta:
+            flag = LOWER
+        else:
+            flag = EXACT
+        self._table.put(key, depth, best, flag, best_move)
+        return best
+
+    def _root(self, depth, moves, left):
+        alpha, beta = -np.inf, np.inf
+        next_seat, next_left = self._next_turn(0, left)
+        best, best_move = -np.inf, moves[0]
+        for cell in moves:
+            if self._make(cell, 0):
+                value = WIN_SCORE
+            elif not self._scratch.has_empty_cell:
+                value = 0
+            else:
+                value = self._search(depth - 1, alpha, beta, next_seat, next_left, 1)
+            self._unmake(cell, 0)
+
+            if value > best:
+                best, best_move = value, cell
+                alpha = max(alpha, best)
+
+        return best, best_move
+
+    def best_move(self, board: Board, left: int):
+        """Search the board within time_limit and return the best cell for the next stone as a flat index"""
+        self._deadline = time.perf_counter() + self.time_limit
+        if self.deadline is not None:
+            self._deadline = min(self._deadline, self.deadline - DEADLINE_MARGIN)
+        self._setup(board)
+        self._table.generation += 1
+
+        moves = self._ordered()
+        best = moves[0]
+        for depth in range(1, self.max_depth + 1):
+            try:
+                value, best = self._root(depth, moves[:2 * self.width], left)
+            except SearchTimeout:
+                self._scratch.follow(board)
+                break
+
+            moves.remove(best)
+            moves.insert(0, best)
+            if self._solved(value):
+                break
+
+        return best
+
+    def _solved(self, value):
+        """True if the value of the root is a win or a loss, which deeper searches don't change"""
+        return abs(value) >= WIN_SCORE / 2
+
+    def ponder(self, board: Board, stop):
+        """Search deeper and deeper from the turn of the next rival until stop is set"""
+        self._setup(board)
+        self._table.generation += 1
+        self._deadline = math.inf
+        self._stop = stop
+        yield
+
+        try:
+            for depth in range(2, self.max_depth + 1):
+                self._search(depth, -np.inf, np.inf, 1, self.stone_each_turn, 0)
+                yield
+        except SearchTimeout:
+            pass
+        finally:
+            self._stop = None
+
+    def play(self, board: Board):
+        left = self.stone_each_turn
+        if self.solver is not None:
+            stones = self.solver.solve(board, self, self._rivals, self.win, self.stone_each_turn,
+                                       deadline=self.solver_deadline())
+            for point in stones or ():
+                yield point
+                left = left - 1 if left > 1 else self.stone_each_turn
+
+        while board.has_empty_cell:
+            cell = self.best_move(board, left)
+            yield divmod(cell, board.size)
+            left = left - 1 if left > 1 else self.stone_each_turn
@@ -0,0 +1,60 @@
+import threading
+from collections import OrderedDict
+
+
+class EvaluationCache(object):
+    _caches = {}
+    _lock = threading.Lock()
+
+    def __init__(self, capacity=2 ** 16):
+        """
+        Least recently used cache of evaluations, keys are meant to be canonical hashes, see canonical_hash,
+        so all rotations and reflections of a position share one entry. Values that refer to cells have to be
+        stored in the canonical orientation, see Symmetries. It can be used by players of concurrent games.
+        """
+        self.capacity = capacity
+        self._entries = OrderedDict()
+        self._mutex = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    @classmethod
+    def of(cls, name, capacity=2 ** 16):
+        """Shared cache of the name, e.g. a model file, every player that evaluates with it fills the same cache"""
+        with cls._lock:
+            cache = cls._caches.get(name)
+            if cache is None:
+                cache = cls._caches[name] = cls(capacity)
+            return cache
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def hits(self):
+        return self._hits
+
+    @property
+    def misses(self):
+        return self._misses
+
+    def get(self, key, default=None):
+        with self._mutex:
+            if key not in self._entries:
+                self._misses += 1
+                return default
+
+            self._hits += 1
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def put(self, key, value):
+        with self._mutex:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._mutex:
+            self._entries.clear()
@@ -0,0 +1,118 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError, wait
+
+
+class Clock(object):
+    def __init__(self, per_move=None, per_game=None, increment=0.):
+        """
+        Time control of Game, it's passed to Game as clock. per_move is the seconds for each stone and per_game
+        the seconds for all stones of a player in a game, increment is added to the time of the game after each
+        stone. Stones are taken from the play generator in a worker thread of each player. When its time runs out
+        the fallback stones of the player are played for the rest of the turn, and the late stone is dropped.
+        The generator isn't resumed anymore and the next turn of the player waits for the late stone before its
+        time starts. Players see the deadline of each stone as their deadline attribute, so searching bots can
+        stop in time.
+        """
+        self.per_move = per_move
+        self.per_game = per_game
+        self.increment = increment
+        self._left = {}
+        self._timeouts = {}
+        self._workers = {}
+        self._pending = {}
+
+    @property
+    def timeouts(self):
+        """Number of turns that each player ran out of time by title"""
+        return self._timeouts
+
+    def start(self, game):
+        for player in game.players:
+            self._left[player] = self.per_game
+            self._timeouts.setdefault(player.title, 0)
+
+    def left(self, player):
+        """Seconds left of the game for the player, None without per_game"""
+        return self._left.get(player)
+
+    def budget(self, player):
+        budgets = [budget for budget in (self.per_move, self._left.get(player)) if budget is not None]
+        return max(0., min(budgets)) if budgets else None
+
+    def busy(self, player):
+        """True while the worker of the player still runs a stone that was dropped"""
+        pending = self._pending.get(player)
+        return pending is not None and not pending.done()
+
+    def _spend(self, player, seconds):
+        if self._left.get(player) is not None:
+            self._left[player] += self.increment - seconds
+
+    def moves(self, player, generator, board):
+        """Wrap a play generator of the player to take each stone within its time"""
+        worker = self._workers.get(player)
+        if worker is None:
+            worker = self._workers[player] = ThreadPoolExecutor(1, thread_name_prefix=player.title)
+        elif player in self._pending:
+            # A stone that was dropped may still run, it isn't charged to this turn
+            wait([self._pending.pop(player)])
+
+        stop = threading.Event()
+        generator = stoppable(generator, stop)
+        timed_out = False
+        try:
+            while True:
+                budget = self.budget(player)
+                start = time.perf_counter()
+                player.deadline = None if budget is None else start + budget
+                self._pending[player] = worker.submit(next, generator, None)
+                try:
+                    point = self._pending[player].result(timeout=budget)
+                except TimeoutError:
+                    timed_out = True
+                    stop.set()
+                    break
+                finally:
+                    self._spend(player, time.perf_counter() - start)
+
+                if point is None:
+                    return
+                yield point
+
+            self._timeouts[player.title] += 1
+            while True:
+                yield player.fallback(board)
+        finally:
+            # The worker is gone when the clock is stopped at the end of the game
+            if player in self._workers:
+                self._pending[player] = worker.submit(close, player, generator)
+                if not timed_out:
+                    self._pending[player].result()
+            else:
+                player.deadline = None
+
+    def stop(self):
+        """Shut down the workers of the players, stones that are still running are dropped"""
+        for worker in self._workers.values():
+            worker.shutdown(wait=False)
+        self._workers = {}
+        self._pending = {}
+
+
+def stoppable(generator, stop):
+    """Play generator that returns at the first resume after stop (a threading.Event) is set"""
+    try:
+        for point in generator:
+            if stop.is_set():
+                return
+            yield point
+    finally:
+        if hasattr(generator, 'close'):
+            generator.close()
+
+
+def close(player, generator):
+    """Close the play generator of the player on its worker, the deadline stays until a late stone is done"""
+    generator.close()
+    player.deadline = None
@@ -1,7 +1,30 @@
+import threading
 import time
 import random
+from contextlib import nullcontext
 from board import Board
 
+UNMEASURED = nullcontext()
+
+
+def keep_pondering(pondering, stop):
+    for _ in pondering:
+        if stop.is_set():
+            break
+    pondering.close()
+
+
+class GameEvent(object):
+    def __init__(self, kind, player=None, point=None, partition=None):
+        """
+        Something that happened in a game, kind is 'turn', 'stone', 'win' or 'draw'.
+        point refers to the stone and partition to the winning line.
+        """
+        self.kind = kind
+        self.player = player
+        self.point = point
+        self.partition = partition
+
 
 class Game(object):
     def __init__(self, board: Board,
@@ -9,8 +32,21 @@ class Game(object):
                  delay=.25,
                  shuffle_players=True,
                  win=6,
-                 stone_each_turn=2):
-        """Game handler"""
+                 stone_each_turn=2,
+                 result_pause=3,
+                 recorder=None,
+                 events=None,
+                 instrumentation=None,
+                 clock=None,
+                 ponder=False):
+        """
+        Game handler, result_pause is the number of seconds that the result stays on the board.
+        recorder is notified of the stones and the result, e.g. a RecordWriter.
+        GameEvent of turns, stones and the result are put on events if it's given, e.g. the queue of a Renderer.
+        instrumentation measures the moves of the players and where the time goes, see Instrumentation.
+        clock limits the time of the players, see Clock. If ponder is on, players search during the turns of
+        rivals in background threads, see Player.ponder.
+        """
         self._board = board
         self._players = players
         self._active_player = 0
@@ -18,6 +54,13 @@ class Game(object):
         self._win = win
         self._stone_each_turn = stone_each_turn
         self._delay = delay
+        self._result_pause = result_pause
+        self._recorder = recorder
+        self._events = events
+        self._instrumentation = instrumentation
+        self._clock = clock
+        self._ponder = ponder
+        self._pondering = {}
 
         if shuffle_players:
             random.shuffle(self._players)
@@ -54,33 +97,104 @@ class Game(object):
     def turn(self):
         self._turn_number += 1
         self._active_player = self._turn_number % len(self._players)
-        self._board.show_message(self.player.title + "'s Turn")
+        with self._measure('render'):
+            self._board.show_message(self.player.title + "'s Turn")
+        if self._events is not None:
+            self._events.put(GameEvent('turn', self.player))
         return self.player
 
+    def _measure(self, section):
+        if self._instrumentation is None:
+            return UNMEASURED
+        return self._instrumentation.measure(section)
+
+    def _start_pondering(self, player):
+        if self._clock and self._clock.busy(player):
+            return
+
+        stop = threading.Event()
+        pondering = player.ponder(self._board, stop)
+        if pondering is None or next(pondering, stop) is stop:
+            return
+
+        thread = threading.Thread(target=keep_pondering, args=(pondering, stop), daemon=True)
+        thread.start()
+        self._pondering[player] = (stop, thread)
+
+    def _stop_pondering(self, player):
+        if player in self._pondering:
+            stop, thread = self._pondering.pop(player)
+            stop.set()
+            thread.join()
+
+    def _release(self):
+        for player in list(self._pondering):
+            self._stop_pondering(player)
+        if self._clock:
+            self._clock.stop()
+
     def handle(self):
+        if self._recorder:
+            self._recorder.begin(self._board, self)
+        if self._instrumentation:
+            self._instrumentation.start(self)
+        if self._clock:
+            self._clock.start(self)
 
         while self._board.has_empty_cell:
             player = self.turn()
             actions_count = 0
-            for point in player.play(self._board):
-                self._board.put_stone(point, player)
+            self._stop_pondering(player)
+            moves = iter(player.play(self._board))
+            if self._instrumentation:
+                moves = self._instrumentation.moves(player, moves)
+            if self._clock:
+                moves = self._clock.moves(player, moves, self._board)
+
+            for point in moves:
+                with self._measure('board'):
+                    placed = self._board.put_stone(point, player)
+                if placed:
+                    if self._recorder:
+                        self._recorder.add(point, player)
+                    if self._events is not None:
+                        self._events.put(GameEvent('stone', player, point))
 
                 if not self._board.has_empty_cell:
                     break
 
                 if self._delay:
-                    self._board.rest(self._delay)
-
+                    with self._measure('render'):
+                        self._board.rest(self._delay)
 
-                max_vicinity = self._board.get_max_partition(player, point)
+                with self._measure('win'):
+                    max_vicinity = self._board.get_max_partition(player, point)
                 if max_vicinity and max_vicinity.count >= self._win:
-                    self._board.show_winner(player, max_vicinity)
-                    time.sleep(3)
+                    with self._measure('render'):
+                        self._board.show_winner(player, max_vicinity)
+                    self._release()
+                    if self._recorder:
+                        self._recorder.end(player)
+                    if self._events is not None:
+                        self._events.put(GameEvent('win', player, point, max_vicinity))
+                    time.sleep(self._result_pause)
                     return player
 
                 actions_count += 1
                 if actions_count >= self._stone_each_turn:
                     break
 
-        self._board.show_draw()
-        time.sleep(3)
+            if self._clock:
+                # The worker of the player closes the generator before it may ponder
+                moves.close()
+            if self._ponder and self._board.has_empty_cell:
+                self._start_pondering(player)
+
+        self._release()
+        with self._measure('render'):
+            self._board.show_draw()
+        if self._recorder:
+            self._recorder.end(None)
+        if self._events is not None:
+            self._events.put(GameEvent('draw'))
+        time.sleep(self._result_pause)
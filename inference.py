@@ -0,0 +1,98 @@
+import threading
+import time
+import numpy as np
+from concurrent.futures import Future
+from queue import Queue, Empty
+from keras.models import load_model
+
+
+class InferenceServer(object):
+    _servers = {}
+    _lock = threading.Lock()
+
+    def __init__(self, model, max_batch=64, max_wait=.005):
+        """
+        Evaluates observations of many concurrent games with one model in micro-batches. Requests are collected
+        by a background thread until max_batch of them are waiting or max_wait seconds passed since the first
+        one, then they are evaluated with one predict call.
+        """
+        self.model = model
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._requests = Queue()
+        self._batches = 0
+        self._evaluated = 0
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+
+    @classmethod
+    def of(cls, path, **kwargs):
+        """Shared server of the model file, the model is loaded once per process"""
+        with cls._lock:
+            server = cls._servers.get(path)
+            if server is None:
+                server = cls(load_model(path), **kwargs)
+                cls._servers[path] = server
+            return server
+
+    @property
+    def input_shape(self):
+        return self.model.input_shape
+
+    @property
+    def mean_batch(self):
+        return self._evaluated / self._batches if self._batches else 0.
+
+    def submit(self, state) -> Future:
+        """Queue one observation and return a future of the model output for it"""
+        future = Future()
+        self._requests.put((np.array(state, copy=True), future))
+        return future
+
+    def evaluate(self, state):
+        return self.submit(state).result()
+
+    def close(self):
+        self._requests.put(None)
+        self._thread.join()
+
+    def _collect(self):
+        request = self._requests.get()
+        if request is None:
+            return None
+
+        batch = [request]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch:
+            timeout = deadline - time.perf_counter()
+            try:
+                request = self._requests.get(timeout=timeout) if timeout > 0 else self._requests.get_nowait()
+            except Empty:
+                break
+
+            if request is None:
+                self._requests.put(None)
+                break
+            batch.append(request)
+
+        return batch
+
+    def _serve(self):
+        while True:
+            batch = self._collect()
+            if batch is None:
+                return
+
+            try:
+                states = np.stack([state for state, _ in batch])
+                states = states.reshape((len(batch),) + tuple(self.input_shape[1:]))
+                outputs = self.model.predict(states, verbose=0)
+            except Exception as error:
+                for _, future in batch:
+                    future.set_exception(error)
+                continue
+
+            self._batches += 1
+            self._evaluated += len(batch)
+            for (_, future), output in zip(batch, outputs):
+                future.set_result(output)
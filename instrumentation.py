@@ -0,0 +1,115 @@
+import cProfile
+import io
+import os
+import pstats
+import time
+import numpy as np
+from contextlib import contextmanager
+
+# Upper bounds of the buckets of move latency histograms in milliseconds, the last bucket is unbounded
+BUCKETS = (.1, .3, 1, 3, 10, 30, 100, 300, 1000, 3000)
+SECTIONS = ('bot', 'board', 'win', 'render')
+
+
+class Instrumentation(object):
+    def __init__(self, profile=(), on_move=None):
+        """
+        Opt-in measurements of games, it's passed to Game as instrumentation. It keeps the latency of each move
+        and the number of generator resumes of every player, and the time of bot code, board updates, win
+        detection and rendering. profile is the titles of players whose play runs under cProfile, or a bool
+        for every player. on_move is called with (player, point, seconds) after each move.
+        """
+        self._profile = profile
+        self._on_move = on_move
+        self._latencies = {}
+        self._resumes = {}
+        self._sections = {section: 0. for section in SECTIONS}
+        self._profiles = {}
+        self._games = 0
+
+    @property
+    def latencies(self):
+        """Seconds of each move of every player by title"""
+        return self._latencies
+
+    def start(self, game):
+        self._games += 1
+        for player in game.players:
+            self._latencies.setdefault(player.title, [])
+            self._resumes.setdefault(player.title, 0)
+
+    @contextmanager
+    def measure(self, section):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._sections[section] += time.perf_counter() - start
+
+    def moves(self, player, generator):
+        """Wrap a play generator of the player to time each resume"""
+        title = player.title
+        latencies = self._latencies.setdefault(title, [])
+        profiler = None
+        if self._profile is True or self._profile and title in self._profile:
+            profiler = self._profiles.setdefault(title, cProfile.Profile())
+
+        while True:
+            self._resumes[title] = self._resumes.get(title, 0) + 1
+            if profiler:
+                profiler.enable()
+            start = time.perf_counter()
+            try:
+                point = next(generator)
+            except StopIteration:
+                return
+            finally:
+                elapsed = time.perf_counter() - start
+                if profiler:
+                    profiler.disable()
+                self._sections['bot'] += elapsed
+
+            latencies.append(elapsed)
+            if self._on_move:
+                self._on_move(player, point, elapsed)
+            yield point
+
+    def profile_stats(self, title, limit=20, sort='cumulative'):
+        """Top functions of the profile of the player as text"""
+        stream = io.StringIO()
+        pstats.Stats(self._profiles[title], stream=stream).sort_stats(sort).print_stats(limit)
+        return stream.getvalue()
+
+    def dump_profiles(self, prefix):
+        """Write the profile of each profiled player to prefix + title + .prof, to be read with pstats"""
+        os.makedirs(os.path.dirname(prefix) or '.', exist_ok=True)
+        for title, profiler in self._profiles.items():
+            profiler.dump_stats('%s%s.prof' % (prefix, title))
+
+    def export(self, profile_limit=20):
+        """Summary of the measurements as a JSON serializable dict"""
+        players = {}
+        for title, latencies in self._latencies.items():
+            players[title] = dict(latency_summary(latencies), resumes=self._resumes.get(title, 0))
+            if title in self._profiles:
+                players[title]['profile'] = self.profile_stats(title, profile_limit)
+
+        return {
+            'games': self._games,
+            'sections': dict(self._sections),
+            'players': players,
+        }
+
+
+def latency_summary(latencies):
+    """Percentiles and a histogram with BUCKETS of move latencies in seconds"""
+    values = np.array(latencies) * 1000
+    histogram = np.bincount(np.searchsorted(BUCKETS, values), minlength=len(BUCKETS) + 1)
+    return {
+        'moves': len(values),
+        'mean_ms': float(values.mean()) if len(values) else 0.,
+        'p50_ms': float(np.percentile(values, 50)) if len(values) else 0.,
+        'p99_ms': float(np.percentile(values, 99)) if len(values) else 0.,
+        'max_ms': float(values.max()) if len(values) else 0.,
+        'histogram': histogram.tolist(),
+    }
@@ -11,6 +11,7 @@ from board import Board, GUIBoard
 from player import Player, WHITE, BLACK
 from bots.ann import ANN
 from bots.greedy import Greedy
+from observation import Observation
 from keras.models import Sequential, load_model, Model
 from keras.layers import Dense, Flatten, Conv2D, Input, Reshape, Concatenate
 from keras.optimizers import Adam
@@ -23,88 +24,132 @@ GUI = True
 SIZE = 13
 WIN = 6
 STONE_TURN = 2
+PLANES = 2
 
 
 class ConnectEnv(Env):
-    def __init__(self):
+    def __init__(self, gui=GUI):
+        """Game against a Greedy rival, it shows the board when gui is on"""
         self.last_result = "Start"
+        self.gui = gui
         self.me = Player('Me', WHITE)
         self.rival = Greedy('Rival', BLACK)
-        if GUI:
+        self.observation = Observation(PLANES)
+        if gui:
             os.environ['SDL_VIDEO_WINDOW_POS'] = "%d,%d" % (0, 0)
             self.board = GUIBoard(size=SIZE)
             self.board.draw()
         else:
-            self.board = Board(size=SIZE)
+            self.board = Board(size=SIZE, silent=True)
 
         self.action_space = Discrete(SIZE * SIZE)
-        self.observation_space = Box(low=0, high=1, shape=(SIZE, SIZE, 2))
+        self.observation_space = Box(low=0, high=1, shape=(SIZE, SIZE, self.observation.planes))
         self.last_reward = 0
+        self.reset_reward()
 
         rival_row, rival_col = self.rival.play(self.board).__next__()
         self.board.put_stone((rival_row, rival_col), self.rival)
         self.state = self.get_state()
 
     def get_state(self):
-        state = np.zeros((SIZE, SIZE, 2), dtype=int)
-        for r, row in enumerate(self.board.map):
-            for c, cell in enumerate(row):
-                if cell is not None:
-                    key = 0 if cell.owner == self.me else 1
-                    state[r, c, key] = 1
-
-        return state
-
-    def calc_reward(self):
+        # The agent keeps observations in its memory, so it gets a copy of the reused buffer
+        return self.observation.encode(self.board, self.me, [self.rival]).copy()
+
+    def line_reward(self, x, y):
+        """
+        Shaped reward of the stones of one line and the done and win flags it sets, the flags are None
+        when the line doesn't set them
+        """
         reward = 0
-        done = not self.board.has_empty_cell
-        win = False
-        for x, y in self.board.utils.get_every_lines_indexes():
-            parts = self.board.utils.line_partition(x, y)
-            for i, part in enumerate(parts):
-                if part.player is not None:
-                    if part.count >= WIN:
-                        done = True
-                        win = part.player == self.me
-                    elif part.player != self.me and part.count >= WIN - STONE_TURN + 1:
-                        done = (
-                                    i - 1 >= 0 and
-                                    parts[i - 1].player is None and
-                                    parts[i - 1].count >= WIN - part.count
-                               ) or (
-                                    i + 1 < len(parts) and
-                                    parts[i + 1].player is None and
-                                    parts[i + 1].count >= WIN - part.count
-                               )
-
-                    right = 0
-                    left = 0
-                    for k in range(i - 1, -1, -1):
-                        if parts[k].player is not None and parts[k].player != part.player:
-                            break
-                        left += parts[k].count
-
-                    for k in range(i + 1, len(parts)):
-                        if parts[k].player is not None and parts[k].player != part.player:
-                            break
-                        right += parts[k].count
-
-                    c = max(0, part.count + min(right, WIN - 1) + min(left, WIN - 1) - WIN)
-                    reward += part.count ** 2 * (2 if part.player == self.me else -3) * c
+        done = None
+        win = None
+        parts = self.board.utils.line_partition(x, y)
+        for i, part in enumerate(parts):
+            if part.player is not None:
+                if part.count >= WIN:
+                    done = True
+                    win = part.player == self.me
+                elif part.player != self.me and part.count >= WIN - STONE_TURN + 1:
+                    done = (
+                                i - 1 >= 0 and
+                                parts[i - 1].player is None and
+                                parts[i - 1].count >= WIN - part.count
+                           ) or (
+                                i + 1 < len(parts) and
+                                parts[i + 1].player is None and
+                                parts[i + 1].count >= WIN - part.count
+                           )
+
+                right = 0
+                left = 0
+                for k in range(i - 1, -1, -1):
+                    if parts[k].player is not None and parts[k].player != part.player:
+                        break
+                    left += parts[k].count
+
+                for k in range(i + 1, len(parts)):
+                    if parts[k].player is not None and parts[k].player != part.player:
+                        break
+                    right += parts[k].count
+
+                c = max(0, part.count + min(right, WIN - 1) + min(left, WIN - 1) - WIN)
+                reward += part.count ** 2 * (2 if part.player == self.me else -3) * c
 
         return reward, done, win
 
+    def reset_reward(self):
+        lines = len(self.board.utils.tables.lines)
+        self.reward = 0
+        self.line_rewards = np.zeros(lines, dtype=np.int64)
+        self.line_done = np.full(lines, -1, dtype=np.int8)
+        self.line_win = np.full(lines, -1, dtype=np.int8)
+        self.synced = 0
+
+    def calc_reward(self):
+        """
+        Keep the reward as a running total, only lines through the stones placed since the last call are
+        scored again. As in a scan over every line, done and win are set by the last line that sets them.
+        """
+        tables = self.board.utils.tables
+        history = self.board.history
+        points = np.array([stone.pos for stone in history[self.synced:]], dtype=np.intp).reshape(-1, 2)
+        self.synced = len(history)
+
+        for line_id in np.unique(tables.cell_lines[points[:, 0], points[:, 1]]).tolist():
+            reward, done, win = self.line_reward(*tables.lines[line_id])
+            self.reward += reward - int(self.line_rewards[line_id])
+            self.line_rewards[line_id] = reward
+            self.line_done[line_id] = -1 if done is None else done
+            self.line_win[line_id] = -1 if win is None else win
+
+        done_lines = np.flatnonzero(self.line_done >= 0)
+        win_lines = np.flatnonzero(self.line_win >= 0)
+        done = bool(self.line_done[done_lines[-1]]) if len(done_lines) else not self.board.has_empty_cell
+        win = bool(self.line_win[win_lines[-1]]) if len(win_lines) else False
+        return self.reward, done, win
+
     def step(self, action):
+        played = self.act(action)
+        if played is None:
+            return self.state, -30, False, {}
+        return self.respond(*played)
+
+    def act(self, action):
+        """Put the stone of the agent, it returns the reward and the done and win flags, None if the cell is taken"""
         row = action // SIZE
         col = action % SIZE
         if not self.board.is_empty((row, col)):
-            return self.state, -30, False, {}
+            return None
 
         self.board.put_stone((row, col), self.me)
 
         reward, done, win = self.calc_reward()
         reward_diff = reward - self.last_reward
         self.last_reward = reward
+        return reward_diff, done, win
+
+    def respond(self, reward_diff, done, win):
+        """Play the stone of the rival unless the game is over, and return the result of the step"""
         info = {}
 
         if not done and self.board.has_empty_cell:
@@ -112,7 +157,8 @@ class ConnectEnv(Env):
             self.board.put_stone((rival_row, rival_col), self.rival)
 
             for x, y in self.board.utils.get_every_lines_indexes((rival_row, rival_col)):
-                max_count, _ = self.rival.max_possibilities(self.board.map[x, y], self.rival, STONE_TURN - 1)
+                rival = self.board.player_index(self.rival)
+                max_count, _ = self.rival.max_possibilities(self.board.grid[x, y], rival, STONE_TURN - 1)
                 if max_count >= WIN:
                     done = True
 
@@ -131,13 +177,14 @@ class ConnectEnv(Env):
         return self.state, reward_diff, done, info
 
     def reset(self, *, seed: Optional[int] = None, return_info: bool = False, options: Optional[dict] = None):
-        if GUI:
+        if self.gui:
             self.board = GUIBoard(size=SIZE)
             self.board.draw()
             self.board.show_message(self.last_result)
         else:
-            self.board = Board(size=SIZE)
+            self.board = Board(size=SIZE, silent=True)
 
+        self.reset_reward()
         rival_row, rival_col = self.rival.play(self.board).__next__()
         self.board.put_stone((rival_row, rival_col), self.rival)
         self.state = self.get_state()
@@ -145,8 +192,64 @@ class ConnectEnv(Env):
         return self.state
 
 
+class VectorConnectEnv(object):
+    def __init__(self, count, gui=False):
+        """
+        Steps count independent ConnectEnv games in lockstep, states are stacked as one array with shape
+        (count, SIZE, SIZE, PLANES) so an agent can choose every action with one batched forward pass.
+        The Greedy rivals of the games scan their lines together with Greedy.refresh_many before they play.
+        A finished game is reset right away, its last state is kept in the info of that step.
+        Only the first game is shown when gui is on.
+        """
+        self.envs = [ConnectEnv(gui=gui and i == 0) for i in range(count)]
+        self.num_envs = count
+        self.action_space = self.envs[0].action_space
+        self.observation_space = self.envs[0].observation_space
+        self.states = np.zeros((count, SIZE, SIZE, PLANES), dtype=np.int8)
+        self.rewards = np.zeros(count)
+        self.dones = np.zeros(count, dtype=bool)
+        for i, env in enumerate(self.envs):
+            self.states[i] = env.state
+
+    def step(self, actions):
+        """
+        :param actions: array of an action for every game
+        :return: states, rewards, dones and a list of infos, the arrays are copies that the next step doesn't change
+        """
+        played = [env.act(int(action)) for env, action in zip(self.envs, actions)]
+        Greedy.refresh_many([
+            (env.rival, env.board, env.board.player_index(env.rival),
+             [env.board.player_index(rival) for rival in env.rival.rivals])
+            for env, result in zip(self.envs, played)
+            if result is not None and not result[1] and env.board.has_empty_cell
+        ])
+
+        infos = []
+        for i, (env, result) in enumerate(zip(self.envs, played)):
+            if result is None:
+                state, reward, done, info = env.state, -30, False, {}
+            else:
+                state, reward, done, info = env.respond(*result)
+            if done:
+                info['terminal_observation'] = state
+                info['result'] = env.last_result
+                state = env.reset()
+
+            self.states[i] = state
+            self.rewards[i] = reward
+            self.dones[i] = done
+            infos.append(info)
+
+        return self.states.copy(), self.rewards.copy(), self.dones.copy(), infos
+
+    def reset(self):
+        for i, env in enumerate(self.envs):
+            self.states[i] = env.reset()
+        return self.states.copy()
+
+
 def build_model():
-    input = Input((1, SIZE, SIZE, 2))
+    input = Input((1, SIZE, SIZE, PLANES))
 
     layer0 = input
     conv1 = Conv2D(8, (2, 2), activation='relu')(layer0)
@@ -169,7 +272,7 @@ def build_model():
 
 
 if __name__ == '__main__':
-    env = ConnectEnv()
+    env = ConnectEnv(gui=GUI)
 
     model = load_model('bots/ann.h5') if exists('bots/ann.h5') else build_model()
     policy = GreedyQPolicy()
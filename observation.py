@@ -0,0 +1,39 @@
+import numpy as np
+
+
+class Observation(object):
+    def __init__(self, planes=2, dtype=np.int8):
+        """
+        Encoder of a board as a (size, size, planes) array relative to a player. The first plane refers to stones
+        of the player and the next ones to its rivals in seat order, rivals that don't fit get the last plane,
+        so with two planes every rival shares the second one. The array is written into a preallocated buffer
+        that is reused by the next call, copy it to keep it.
+        """
+        self.planes = planes
+        self.dtype = dtype
+        self._buffer = None
+        self._seats = np.arange(planes, dtype=np.int8)
+
+    def encode(self, board, player, rivals=()):
+        """
+        Encode stones of the board from the view of the player
+        :param board: Board
+        :param player: Player
+        :param rivals: List[Player]
+        :return: np.ndarray
+        """
+        size = board.size
+        if self._buffer is None or self._buffer.shape[0] != size:
+            self._buffer = np.zeros((size, size, self.planes), dtype=self.dtype)
+
+        me = board.player_index(player)
+        indexes = [board.player_index(rival) for rival in rivals]
+
+        # Plane of each player index on the board, -1 for empty cells
+        planes = np.full(len(board.players), self.planes - 1, dtype=np.int8)
+        planes[0] = -1
+        planes[indexes] = np.minimum(np.arange(1, len(indexes) + 1), self.planes - 1)
+        planes[me] = 0
+
+        np.equal(planes[board.grid][:, :, None], self._seats, out=self._buffer, casting='unsafe')
+        return self._buffer
@@ -1,3 +1,5 @@
+import random
+import time
 import numpy as np
 from abc import abstractmethod
 from board import Board, GUIBoard
@@ -9,18 +11,22 @@ RED = (255, 0, 0)
 GREEN = (0, 255, 0)
 BLUE = (0, 0, 255)
 BLACK = (0, 0, 0)
+# Seconds before the deadline of a stone that searching bots stop, to return the stone in time
+DEADLINE_MARGIN = .02
 
 
 class Player(object):
     def __init__(self, title: str, color: tuple):
         """
-        Each player (human or AI) in the game has to be a Player instance
+        Each player (human or AI) in the game has to be a Player instance.
+        deadline is the time.perf_counter() by which the current stone is due when Game has a Clock, otherwise None.
         """
         self._title = title
         self._border_color = color
         self._color = tuple(np.round((7 * np.array(color) + 3 * np.array((127, 127, 127))) / 10).astype(int))
         self._is_ai = True
         self._rivals = []
+        self.deadline = None
 
     def prepare(self, board: Board, game: Game):
         count = len(game.players)
@@ -57,6 +63,36 @@ class Player(object):
         """
         pass
 
+    def ponder(self, board: Board, stop):
+        """
+        Optional search during the turns of rivals, Game calls it after each turn of the player if it ponders.
+        It's a generator whose first step runs right away, so it can sync with the board, and the rest runs in
+        a background thread until it ends or stop (a threading.Event) is set. The board must not be read after
+        the first step. The player's next turn starts when the thread finishes, so it has to check stop often.
+        """
+        return None
+
+    def solver_deadline(self):
+        """
+        Deadline for a search that runs before the main one within the same stone, e.g. a ThreatSolver: halfway
+        between now and the deadline of the stone less DEADLINE_MARGIN, so the rest is left for the main search.
+        None without Clock.
+        """
+        if self.deadline is None:
+            return None
+        return (time.perf_counter() + self.deadline - DEADLINE_MARGIN) / 2
+
+    def fallback(self, board: Board):
+        """Stone that Game plays for the player when its Clock runs out, a random empty cell near stones"""
+        candidates = board.candidates()
+        if not len(candidates) and isinstance(board, Board):
+            candidates = np.flatnonzero(board.grid.reshape(-1) == 0)
+
+        choice = candidates[random.randrange(len(candidates))]
+        if np.ndim(choice):
+            return tuple(int(value) for value in choice)
+        return divmod(int(choice), board.size)
+
 
 class Human(Player):
     def __init__(self, title, color):
@@ -0,0 +1,151 @@
+import struct
+import numpy as np
+from array import array
+from board import Board
+from player import Player, WHITE, BLACK, BLUE, RED, GREEN
+
+MAGIC = b'CONNREC1'
+# size, win, stone_each_turn, number of players, seat of the winner (255 for a draw) and number of stones
+HEADER = struct.Struct('<HBBBBI')
+DRAW = 255
+COLORS = [WHITE, BLACK, BLUE, RED, GREEN]
+
+
+def move_typecode(size):
+    """Typecode of the flat cell indexes of moves, uint16 up to 256x256 boards and uint32 beyond"""
+    return 'H' if size * size <= 1 << 16 else 'I'
+
+
+class RecordWriter(object):
+    def __init__(self, file):
+        """
+        Writes games into a binary record file, or any binary file object. Each game is a header with the
+        settings and titles of the players in seat order, followed by the moves as flat cell indexes, uint16 or
+        uint32 for boards larger than 256x256, and the seat of each move as uint8. It's meant to be passed to Game
+        as recorder, boards need a size.
+        """
+        if isinstance(file, str):
+            file = open(file, 'ab')
+
+        self._file = file
+        self._players = []
+        self._settings = None
+        self._moves = array('H')
+        self._seats = array('B')
+        if file.tell() == 0:
+            file.write(MAGIC)
+
+    def begin(self, board: Board, game):
+        if board.size is None:
+            raise ValueError('Games on unbounded boards can not be recorded')
+
+        self._players = list(game.players)
+        self._settings = (board.size, game.win, game.stone_each_turn)
+        self._moves = array(move_typecode(board.size))
+        self._seats = array('B')
+
+    def add(self, point, player):
+        self._moves.append(point[0] * self._settings[0] + point[1])
+        self._seats.append(self._players.index(player))
+
+    def end(self, winner=None):
+        size, win, stone_each_turn = self._settings
+        seat = DRAW if winner is None else self._players.index(winner)
+        self._file.write(HEADER.pack(size, win, stone_each_turn, len(self._players), seat, len(self._moves)))
+        for player in self._players:
+            title = player.title.encode('utf-8')[:255]
+            self._file.write(bytes((len(title),)) + title)
+
+        self._file.write(self._moves.tobytes())
+        self._file.write(self._seats.tobytes())
+        self._file.flush()
+
+    def append(self, data: bytes):
+        """Append games that are written by another RecordWriter, e.g. on an in-memory file of a worker process"""
+        if data.startswith(MAGIC):
+            data = data[len(MAGIC):]
+        self._file.write(data)
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class GameRecord(object):
+    def __init__(self, size, win, stone_each_turn, titles, winner, moves, seats):
+        """
+        A recorded game, winner is the seat of the winner or None for a draw and moves and seats are
+        arrays of the flat cell indexes and seats of the stones in order
+        """
+        self.size = size
+        self.win = win
+        self.stone_each_turn = stone_each_turn
+        self.titles = titles
+        self.winner = winner
+        self.moves = moves
+        self.seats = seats
+
+    def __len__(self):
+        return len(self.moves)
+
+    def replay(self, board: Board = None, players=None, upto=None):
+        """
+        Put the first upto stones (every stone by default) on a board with push, without rendering or delays.
+        players are the Player instances of the seats, placeholders with the recorded titles are used by default.
+        """
+        if board is None:
+            board = Board(self.size, silent=True)
+        if players is None:
+            players = [Player(title, COLORS[i % len(COLORS)]) for i, title in enumerate(self.titles)]
+
+        count = len(self.moves) if upto is None else min(upto, len(self.moves))
+        for move, seat in zip(self.moves[:count].tolist(), self.seats[:count].tolist()):
+            board.push(divmod(move, self.size), players[seat])
+
+        return board
+
+
+class RecordReader(object):
+    def __init__(self, path):
+        """
+        Memory-mapped reader of a record file, only the headers are read to index the games,
+        moves of a game are read when it's accessed
+        """
+        self._data = np.memmap(path, dtype=np.uint8, mode='r')
+        if bytes(self._data[:len(MAGIC)]) != MAGIC:
+            raise ValueError('%s is not a game record file' % path)
+
+        view = memoryview(self._data)
+        self._offsets = []
+        offset = len(MAGIC)
+        while offset < len(view):
+            self._offsets.append(offset)
+            size, _, _, players, _, count = HEADER.unpack_from(view, offset)
+            offset += HEADER.size
+            for _ in range(players):
+                offset += 1 + view[offset]
+            offset += (np.dtype(move_typecode(size)).itemsize + 1) * count
+
+    def __len__(self):
+        return len(self._offsets)
+
+    def __getitem__(self, index) -> GameRecord:
+        offset = self._offsets[index]
+        size, win, stone_each_turn, players, winner, count = HEADER.unpack_from(self._data, offset)
+        offset += HEADER.size
+
+        titles = []
+        for _ in range(players):
+            length = int(self._data[offset])
+            titles.append(bytes(self._data[offset + 1:offset + 1 + length]).decode('utf-8'))
+            offset += 1 + length
+
+        dtype = np.dtype(move_typecode(size)).newbyteorder('<')
+        moves = np.frombuffer(self._data, dtype=dtype, count=count, offset=offset)
+        seats = np.frombuffer(self._data, dtype=np.uint8, count=count, offset=offset + dtype.itemsize * count)
+        return GameRecord(size, win, stone_each_turn, titles, None if winner == DRAW else winner, moves, seats)
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
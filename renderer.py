@@ -0,0 +1,80 @@
+import threading
+import time
+import pygame
+from queue import Queue, Empty
+from board import GUIBoard
+from game import Game
+
+
+class Renderer(object):
+    def __init__(self, size, fps=30, background='wood.jpg', result_pause=3):
+        """
+        Window that shows a game running in another thread. The game puts its events on the events queue and
+        the renderer draws the latest state on a GUIBoard at most fps times per second, so bots run at full speed
+        and the window stays responsive while they think. pygame is driven from the thread that calls watch,
+        because some platforms only allow the display on the main thread.
+        """
+        self.events = Queue()
+        self.fps = fps
+        self.result_pause = result_pause
+        self._size = size
+        self._background = background
+        self._view = None
+        self._winner = None
+        self._finished = threading.Event()
+
+    def watch(self, game: Game):
+        """
+        Play the game in a background thread and render its events until it ends and result_pause passes.
+        The game has to be created with events of this renderer and a board without GUI.
+        It returns the winner, or None for a draw or if the window is closed.
+        """
+        self._view = GUIBoard(self._size, background=self._background, fps=self.fps)
+        self._view.draw()
+        self._finished.clear()
+        thread = threading.Thread(target=self._play, args=(game,), daemon=True)
+        thread.start()
+
+        clock = pygame.time.Clock()
+        result_at = None
+        while result_at is None or time.perf_counter() - result_at < self.result_pause:
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT:
+                    return None
+
+            if self._consume() and result_at is None:
+                result_at = time.perf_counter()
+            elif result_at is None and self._finished.is_set() and self.events.empty():
+                result_at = time.perf_counter()
+
+            self._view.flush(force=True)
+            clock.tick(self.fps)
+
+        thread.join()
+        return self._winner
+
+    def _play(self, game: Game):
+        try:
+            self._winner = game.handle()
+        finally:
+            self._finished.set()
+
+    def _consume(self):
+        """Apply the queued events to the view, it returns True when the result is shown"""
+        finished = False
+        while True:
+            try:
+                event = self.events.get_nowait()
+            except Empty:
+                return finished
+
+            if event.kind == 'stone':
+                self._view.put_stone(event.point, event.player)
+            elif event.kind == 'turn':
+                self._view.show_message(event.player.title + "'s Turn")
+            elif event.kind == 'win':
+                self._view.show_winner(event.player, event.partition)
+                finished = True
+            elif event.kind == 'draw':
+                self._view.show_draw()
+                finished = True
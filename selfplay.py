@@ -0,0 +1,291 @@
+import argparse
+import json
+import os
+import random
+import time
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from board import Board
+from game import Game
+from observation import Observation
+from utils import Symmetries
+from tournament import BotFactory, COLORS
+
+INDEX = 'index.json'
+FIELDS = ('states', 'moves', 'outcomes')
+
+
+def move_dtype(size):
+    """dtype of the flat cell indexes of moves, int16 up to 181x181 boards and int32 beyond"""
+    return np.int16 if size * size <= np.iinfo(np.int16).max + 1 else np.int32
+
+
+class ShardWriter(object):
+    def __init__(self, path, prefix, size, planes=2, capacity=2 ** 16):
+        """
+        Stream records into fixed-size memory-mapped shards in the path, named prefix-0, prefix-1 and so on.
+        Each shard is a .npy file per field, states as int8 (capacity, size, size, planes), moves as flat cell
+        indexes and outcomes as 1 for a win, -1 for a loss and 0 for a draw, from the view of the player to move.
+        """
+        self._path = path
+        self._prefix = prefix
+        self._size = size
+        self._planes = planes
+        self._capacity = capacity
+        self._shards = []
+        self._arrays = None
+        self._count = 0
+
+    @property
+    def shards(self):
+        """Name and number of records of every shard that is written"""
+        return [{'name': name, 'count': count} for name, count in self._shards]
+
+    def _open(self):
+        name = '%s-%d' % (self._prefix, len(self._shards))
+        shapes = {
+            'states': ((self._capacity, self._size, self._size, self._planes), np.int8),
+            'moves': ((self._capacity,), move_dtype(self._size)),
+            'outcomes': ((self._capacity,), np.int8),
+        }
+        self._arrays = {
+            field: np.lib.format.open_memmap(
+                os.path.join(self._path, '%s.%s.npy' % (name, field)), mode='w+', dtype=dtype, shape=shape)
+            for field, (shape, dtype) in shapes.items()
+        }
+        self._shards.append((name, 0))
+        self._count = 0
+
+    def write(self, states, moves, outcomes):
+        start = 0
+        while start < len(moves):
+            if self._arrays is None or self._count == self._capacity:
+                self.flush()
+                self._open()
+
+            count = min(len(moves) - start, self._capacity - self._count)
+            end = self._count + count
+            self._arrays['states'][self._count:end] = states[start:start + count]
+            self._arrays['moves'][self._count:end] = moves[start:start + count]
+            self._arrays['outcomes'][self._count:end] = outcomes[start:start + count]
+            self._count = end
+            self._shards[-1] = (self._shards[-1][0], end)
+            start += count
+
+    def flush(self):
+        if self._arrays is not None:
+            for array in self._arrays.values():
+                array.flush()
+
+    def close(self):
+        self.flush()
+        self._arrays = None
+        return self.shards
+
+
+class SelfPlayData(object):
+    def __init__(self, path):
+        """
+        Read-only view of the shards listed in the index of the path. Shards are memory-mapped,
+        so only the records that are read are loaded.
+        """
+        with open(os.path.join(path, INDEX)) as file:
+            index = json.load(file)
+
+        self.size = index['size']
+        self.planes = index['planes']
+        self._shards = []
+        for shard in index['shards']:
+            arrays = {
+                field: np.load(os.path.join(path, '%s.%s.npy' % (shard['name'], field)), mmap_mode='r')
+                for field in FIELDS
+            }
+            self._shards.append((shard['count'], arrays))
+
+        self._offsets = np.cumsum([0] + [count for count, _ in self._shards])
+
+    def __len__(self):
+        return int(self._offsets[-1])
+
+    def read(self, indexes):
+        """
+        :param indexes: array of record indexes
+        :return: states, moves and outcomes of the records, in the order of indexes
+        """
+        indexes = np.asarray(indexes)
+        states = np.empty((len(indexes), self.size, self.size, self.planes), dtype=np.int8)
+        moves = np.empty(len(indexes), dtype=move_dtype(self.size))
+        outcomes = np.empty(len(indexes), dtype=np.int8)
+
+        shards = np.searchsorted(self._offsets, indexes, side='right') - 1
+        for shard in np.unique(shards):
+            selected = np.flatnonzero(shards == shard)
+            _, arrays = self._shards[shard]
+            local = indexes[selected] - self._offsets[shard]
+            order = np.argsort(local)
+            rows = selected[order]
+            local = local[order]
+            states[rows] = arrays['states'][local]
+            moves[rows] = arrays['moves'][local]
+            outcomes[rows] = arrays['outcomes'][local]
+
+        return states, moves, outcomes
+
+    def batches(self, batch_size, shuffle=True, seed=None, augment=False):
+        """Records in batches, with augment each record is rotated or reflected randomly"""
+        rng = np.random.default_rng(seed)
+        order = rng.permutation(len(self)) if shuffle else np.arange(len(self))
+        for start in range(0, len(order), batch_size):
+            states, moves, outcomes = self.read(order[start:start + batch_size])
+            if augment:
+                states, moves = transform_records(states, moves, rng.integers(0, 8, len(moves)))
+            yield states, moves, outcomes
+
+
+def transform_records(states, moves, transforms):
+    """Apply a transform of Symmetries to the state and move of each record"""
+    count, size = states.shape[:2]
+    maps = Symmetries.of(size).maps[transforms]
+    result = np.empty_like(states)
+    result.reshape(count, size * size, -1)[np.arange(count)[:, None], maps] = states.reshape(count, size * size, -1)
+    return result, maps[np.arange(count), moves].astype(moves.dtype)
+
+
+def game_records(board: Board, players, winner, observation: Observation):
+    """
+    Replay the stones of a finished game on a scratch board and encode the state before each stone
+    from the view of the player that put it, with its rivals in seat order
+    """
+    seats = {player: i for i, player in enumerate(players)}
+    history = board.history
+    scratch = Board(board.size, silent=True)
+    states = np.empty((len(history), board.size, board.size, observation.planes), dtype=np.int8)
+    moves = np.empty(len(history), dtype=move_dtype(board.size))
+    outcomes = np.empty(len(history), dtype=np.int8)
+
+    for i, stone in enumerate(history):
+        player = stone.owner
+        seat = seats[player]
+        rivals = [players[(seat + j) % len(players)] for j in range(1, len(players))]
+        states[i] = observation.encode(scratch, player, rivals)
+        moves[i] = stone.pos[0] * board.size + stone.pos[1]
+        outcomes[i] = 0 if winner is None else (1 if player is winner else -1)
+        scratch.push(stone.pos, player)
+
+    return states, moves, outcomes
+
+
+def play_games(entries, seeds, path, prefix, size, win, stone_each_turn, planes, capacity):
+    """
+    Play headless games between the entries that are (title, factory) pairs, one game for each seed,
+    and write their records into shards. It returns the shards and the result of each game.
+    """
+    writer = ShardWriter(path, prefix, size, planes, capacity)
+    observation = Observation(planes)
+    results = []
+    for seed in seeds:
+        random.seed(seed)
+        np.random.seed(seed % 2 ** 32)
+
+        players = [factory(title, COLORS[i % len(COLORS)]) for i, (title, factory) in enumerate(entries)]
+        board = Board(size, silent=True)
+        game = Game(board, players, delay=0, win=win, stone_each_turn=stone_each_turn, result_pause=0)
+        winner = game.handle()
+        writer.write(*game_records(board, game.players, winner, observation))
+        results.append({'winner': winner.title if winner else None, 'stones': len(board.history)})
+
+    return writer.close(), results
+
+
+class SelfPlay(object):
+    def __init__(self, entries, path, games=100, size=13, win=6, stone_each_turn=2, planes=2,
+                 capacity=2 ** 16, workers=None, seed=0):
+        """
+        Generate training records from headless games between Player factories in worker processes.
+        entries is a dict of title to factory and all of them play in every game. Each worker writes its own
+        shards and the index of the path lists them with the shards of previous runs with the same settings.
+        """
+        self._entries = list(dict(entries).items())
+        self._path = path
+        self._games = games
+        self._size = size
+        self._win = win
+        self._stone_each_turn = stone_each_turn
+        self._planes = planes
+        self._capacity = capacity
+        self._workers = workers or os.cpu_count()
+        self._seed = seed
+
+    def _index(self):
+        path = os.path.join(self._path, INDEX)
+        if os.path.exists(path):
+            with open(path) as file:
+                index = json.load(file)
+
+            if index['size'] != self._size or index['planes'] != self._planes:
+                raise ValueError('Index of %s has another board size or planes' % self._path)
+            return index
+
+        return {'size': self._size, 'planes': self._planes, 'runs': 0, 'shards': []}
+
+    def run(self):
+        os.makedirs(self._path, exist_ok=True)
+        index = self._index()
+        run = index['runs']
+        index['runs'] += 1
+        seeds = np.arange(self._seed, self._seed + self._games)
+        chunks = [chunk.tolist() for chunk in np.array_split(seeds, self._workers) if len(chunk)]
+
+        start = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=self._workers) as executor:
+            futures = [
+                executor.submit(play_games, self._entries, chunk, self._path, 'run%d-worker%d' % (run, i),
+                                self._size, self._win, self._stone_each_turn, self._planes, self._capacity)
+                for i, chunk in enumerate(chunks)
+            ]
+            outputs = [future.result() for future in futures]
+
+        results = []
+        for shards, games in outputs:
+            index['shards'].extend(shards)
+            results.extend(games)
+
+        with open(os.path.join(self._path, INDEX), 'w') as file:
+            json.dump(index, file, indent=2)
+
+        return {
+            'games': len(results),
+            'records': sum(result['stones'] for result in results),
+            'elapsed': time.perf_counter() - start,
+            'results': results,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate self-play records into memory-mapped shards')
+    parser.add_argument('path', help='directory of the shards and their index')
+    parser.add_argument('bots', nargs='+', help="bots as title=module:Class, e.g. greedy=bots.greedy:Greedy")
+    parser.add_argument('--games', type=int, default=100)
+    parser.add_argument('--size', type=int, default=13)
+    parser.add_argument('--win', type=int, default=6)
+    parser.add_argument('--stone-each-turn', type=int, default=2)
+    parser.add_argument('--planes', type=int, default=2, help='planes of the encoded states')
+    parser.add_argument('--capacity', type=int, default=2 ** 16, help='records of each shard')
+    parser.add_argument('--workers', type=int, default=None, help='number of processes, default is cpu count')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    entries = {}
+    for i, bot in enumerate(args.bots):
+        title, _, spec = bot.rpartition('=')
+        entries[title or '%s-%d' % (spec, i)] = BotFactory(spec)
+
+    selfplay = SelfPlay(entries, args.path, games=args.games, size=args.size, win=args.win,
+                        stone_each_turn=args.stone_each_turn, planes=args.planes, capacity=args.capacity,
+                        workers=args.workers, seed=args.seed)
+    report = selfplay.run()
+    print('%d games, %d records in %.2fs' % (report['games'], report['records'], report['elapsed']))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,46 @@
+import random
+import numpy as np
+import pytest
+from board import Board
+from game import Game
+from player import WHITE, BLACK
+from bots.greedy import Greedy
+
+
+def prepare(own, rival):
+    board = Board(13, silent=True)
+    greedy, other = Greedy('Greedy', WHITE), Greedy('Other', BLACK)
+    Game(board, [greedy, other], delay=0, result_pause=0, shuffle_players=False)
+    for point in own:
+        board.put_stone(point, greedy)
+    for point in rival:
+        board.put_stone(point, other)
+    return board, greedy
+
+
+def turn(board, greedy):
+    stones = []
+    for point in greedy.play(board):
+        board.put_stone(point, greedy)
+        stones.append(point)
+        if len(stones) == greedy.stone_each_turn:
+            return stones
+
+
+# Forced stones are resolved line by line before the scores, so their order is pinned here
+@pytest.mark.parametrize('own, rival, expected', [
+    # Block an open four from both ends
+    ([(0, 0), (12, 12)], [(6, 3), (6, 4), (6, 5), (6, 6)], [(6, 2), (6, 7)]),
+    # Win before blocking
+    ([(2, 2), (2, 3), (2, 4), (2, 5)], [(6, 3), (6, 4), (6, 5), (6, 6)], [(2, 0), (2, 1)]),
+    # Block the gap of a row, then a column
+    ([(0, 0), (12, 12)], [(6, 3), (6, 4), (6, 6), (6, 7), (3, 9), (4, 9), (5, 9), (7, 9)], [(6, 5), (6, 9)]),
+    # Block an open five from both ends
+    ([(0, 0), (12, 12)], [(6, 1), (6, 2), (6, 3), (6, 4), (6, 5)], [(6, 6), (6, 0)]),
+])
+@pytest.mark.parametrize('seed', [0, 1])
+def test_forced_actions(own, rival, expected, seed):
+    random.seed(seed)
+    np.random.seed(seed)
+    board, greedy = prepare(own, rival)
+    assert turn(board, greedy) == expected
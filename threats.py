@@ -0,0 +1,188 @@
+import itertools
+import time
+import numpy as np
+from board import Board
+
+ATTACKER, DEFENDER = 0, 1
+
+
+class SolverTimeout(Exception):
+    pass
+
+
+class ThreatSolver(object):
+    def __init__(self, max_depth=4, max_nodes=2000, time_limit=.1):
+        """
+        Threat-space search for forced wins. A threat is a range with length win that the attacker can fill
+        in its next turn, a turn is forcing when its threats take every stone of the rivals' turns to block.
+        Rivals are merged into one defender that places all of their stones of a round, so a win against it is
+        a win against any rivals. Only forcing turns are searched, each of them against every blocking set
+        of the defender, deepening up to max_depth turns of the attacker within max_nodes and time_limit seconds.
+        """
+        self.max_depth = max_depth
+        self.max_nodes = max_nodes
+        self.time_limit = time_limit
+        self._nodes = 0
+        self._deadline = 0
+
+    @property
+    def nodes(self):
+        return self._nodes
+
+    def _setup(self, board: Board, player, win, stone_each_turn, rivals):
+        tables = board.utils.tables
+        cells = board.utils.cells[:board.size * board.size]
+        self._win = win
+        self._stone_each_turn = stone_each_turn
+        self._defense = stone_each_turn * rivals
+        self._windows = tables.windows(win)
+        self._cell_windows = tables.cell_windows(win)
+
+        me = board.player_index(player)
+        self._owner = np.where(cells == me, 1, np.where(cells != 0, 2, 0)).astype(np.int8)
+        values = self._owner[self._windows]
+        self._counts = np.zeros((2, len(self._windows) + 1), dtype=np.intp)
+        self._counts[ATTACKER, :-1] = (values == 1).sum(axis=1)
+        self._counts[DEFENDER, :-1] = (values == 2).sum(axis=1)
+
+    def _place(self, cells, side):
+        for cell in cells:
+            self._owner[cell] = side + 1
+            self._counts[side, self._cell_windows[cell]] += 1
+        self._counts[side, -1] = 0
+
+    def _remove(self, cells, side):
+        for cell in cells:
+            self._owner[cell] = 0
+            self._counts[side, self._cell_windows[cell]] -= 1
+        self._counts[side, -1] = 0
+
+    def _threats(self, side, stones):
+        """Empty cells of each range that the side can fill with the given number of stones, as sets"""
+        counts = self._counts[:, :-1]
+        windows = self._windows[np.flatnonzero((counts[1 - side] == 0) & (counts[side] >= self._win - stones))]
+        return [set(window[self._owner[window] == 0].tolist()) for window in windows]
+
+    def _zone(self, stones):
+        """
+        Ranges that turn into threats of the attacker with the given number of stones, as a dict of each empty
+        cell to the ids of the ranges through it, and the number of attacker stones and empty cells of each range
+        """
+        counts = self._counts[:, :-1]
+        least = max(1, self._win - self._stone_each_turn - stones)
+        ids = np.flatnonzero((counts[DEFENDER] == 0) & (counts[ATTACKER] >= least))
+        zone, ranges = {}, {}
+        for window_id, window in zip(ids.tolist(), self._windows[ids]):
+            empties = set(window[self._owner[window] == 0].tolist())
+            ranges[window_id] = (int(counts[ATTACKER, window_id]), empties)
+            for cell in empties:
+                zone.setdefault(cell, []).append(window_id)
+        return zone, ranges
+
+    def _threats_after(self, move, zone, ranges):
+        """
+        Threats of the attacker for its next turn if the move is placed. The attacker has no threats on its turn,
+        since it would fill them, so the new threats are ranges of the zone through the move.
+        """
+        added = {}
+        for cell in move:
+            for window_id in zone.get(cell, ()):
+                added[window_id] = added.get(window_id, 0) + 1
+
+        threats = []
+        for window_id, count in added.items():
+            stones, empties = ranges[window_id]
+            if stones + count >= self._win - self._stone_each_turn:
+                threats.append(empties.difference(move))
+        return threats
+
+    def _blocks(self, threats, stones, chosen=frozenset(), index=0, found=None):
+        """Every set of at most stones cells that hits all threats, branching on the cells of the first threat left"""
+        if found is None:
+            found = set()
+
+        while index < len(threats) and not threats[index].isdisjoint(chosen):
+            index += 1
+
+        if index == len(threats):
+            found.add(chosen)
+        elif len(chosen) < stones:
+            for cell in threats[index]:
+                self._blocks(threats, stones, chosen | {cell}, index + 1, found)
+
+        return found
+
+    def _attack(self, depth, stones):
+        """Stones of the attacker that win by force within depth turns, or None"""
+        self._nodes += 1
+        if self._nodes > self.max_nodes or time.perf_counter() > self._deadline:
+            raise SolverTimeout()
+
+        wins = self._threats(ATTACKER, stones)
+        if wins:
+            return sorted(wins[0])
+        if depth == 0:
+            return None
+
+        # Threats of the defender have to be blocked by the same stones
+        dangers = self._threats(DEFENDER, self._defense)
+        if dangers and not self._blocks(dangers, stones):
+            return None
+
+        zone, ranges = self._zone(stones)
+        candidates = set(zone).union(*dangers)
+        forcing = []
+        for move in itertools.combinations(sorted(candidates), stones):
+            if any(danger.isdisjoint(move) for danger in dangers):
+                continue
+
+            threats = self._threats_after(move, zone, ranges)
+            defenses = self._blocks(threats, self._defense) if threats else None
+
+            if threats and not defenses:
+                return list(move)
+            if defenses and min(len(defense) for defense in defenses) == self._defense:
+                forcing.append((len(defenses), -len(threats), move, defenses))
+
+        forcing.sort(key=lambda item: item[:2])
+        for _, _, move, defenses in forcing:
+            self._place(move, ATTACKER)
+            for defense in defenses:
+                self._place(defense, DEFENDER)
+                result = self._attack(depth - 1, self._stone_each_turn)
+                self._remove(defense, DEFENDER)
+                if result is None:
+                    break
+            else:
+                self._remove(move, ATTACKER)
+                return list(move)
+
+            self._remove(move, ATTACKER)
+
+        return None
+
+    def solve(self, board: Board, player, rivals, win=6, stone_each_turn=2, left=None, deadline=None):
+        """
+        Stones of the player for the rest of its turn, left stones by default a whole turn, that start a forced
+        win. It returns None if there is none within the limits. deadline is a time.perf_counter() that cuts
+        time_limit, e.g. the deadline of the player.
+        """
+        if not rivals:
+            return None
+
+        self._setup(board, player, win, stone_each_turn, len(rivals))
+        self._nodes = 0
+        self._deadline = time.perf_counter() + self.time_limit
+        if deadline is not None:
+            self._deadline = min(self._deadline, deadline)
+
+        # Deepening finds the shortest win, so following the solver turn after turn keeps getting closer to it
+        try:
+            for depth in range(1, self.max_depth + 1):
+                cells = self._attack(depth, left or stone_each_turn)
+                if cells is not None:
+                    return [divmod(cell, board.size) for cell in cells]
+        except SolverTimeout:
+            pass
+
+        return None
@@ -0,0 +1,234 @@
+import argparse
+import itertools
+import importlib
+import io
+import json
+import os
+import random
+import time
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from board import Board
+from clock import Clock
+from game import Game
+from instrumentation import Instrumentation, latency_summary, SECTIONS
+from player import WHITE, BLACK, BLUE, RED, GREEN
+from record import RecordWriter
+
+COLORS = [WHITE, BLACK, BLUE, RED, GREEN]
+
+
+class BotFactory(object):
+    def __init__(self, spec, **kwargs):
+        """
+        Picklable Player factory that refers to a bot class with 'module:Class', e.g. 'bots.greedy:Greedy'.
+        The module is imported in the worker process, so bots with heavy dependencies are loaded only where they play.
+        """
+        self._spec = spec
+        self._kwargs = kwargs
+
+    @property
+    def spec(self):
+        return self._spec
+
+    def __call__(self, title, color):
+        module, name = self._spec.split(':')
+        return getattr(importlib.import_module(module), name)(title, color, **self._kwargs)
+
+
+def play_game(entries, size, win, stone_each_turn, seed, record=False, profile=None, clock=None):
+    """
+    Play one headless game between the entries that are (title, factory) pairs and return the title of
+    the winner (None for a draw), the number of stones, move latencies and generator resumes of each player
+    and the seconds of each section of Instrumentation. If record is on, the game record is returned as bytes too.
+    If profile is given, players run under cProfile and their profiles are written to profile + seed-title.prof.
+    clock is the Clock of the game, the number of turns that each player ran out of time is returned with it.
+    """
+    random.seed(seed)
+    np.random.seed(seed % 2 ** 32)
+
+    players = [factory(title, COLORS[i % len(COLORS)]) for i, (title, factory) in enumerate(entries)]
+    instrumentation = Instrumentation(profile=profile is not None)
+    file = io.BytesIO() if record else None
+    board = Board(size, silent=True)
+    game = Game(board, players, delay=0, win=win, stone_each_turn=stone_each_turn, result_pause=0,
+                recorder=RecordWriter(file) if record else None, instrumentation=instrumentation, clock=clock)
+    winner = game.handle()
+    if profile is not None:
+        instrumentation.dump_profiles('%s%d-' % (profile, seed))
+
+    report = instrumentation.export()
+    result = {
+        'players': [title for title, _ in entries],
+        'winner': winner.title if winner else None,
+        'stones': len(board.history),
+        'latencies': instrumentation.latencies,
+        'resumes': {title: row['resumes'] for title, row in report['players'].items()},
+        'sections': report['sections'],
+        'timeouts': clock.timeouts if clock else {title: 0 for title, _ in entries},
+    }
+    if record:
+        result['record'] = file.getvalue()
+    return result
+
+
+class Tournament(object):
+    def __init__(self, entries, games=10, size=13, win=6, stone_each_turn=2, workers=None, seed=0, record=None,
+                 profile=None, clock=None):
+        """
+        Round-robin tournament between Player factories. entries is a dict of title to factory,
+        factories are called with (title, color) in worker processes, so they have to be picklable.
+        Every pair of entries plays the given number of games, seats are shuffled by Game.
+        Games are appended to the record file if record is given.
+        If profile is given, profiles of the players of each game are written with that path prefix, see play_game.
+        clock is the time control of every game, see Clock.
+        """
+        self._entries = dict(entries)
+        self._games = games
+        self._size = size
+        self._win = win
+        self._stone_each_turn = stone_each_turn
+        self._workers = workers or os.cpu_count()
+        self._seed = seed
+        self._record = record
+        self._profile = profile
+        self._clock = clock
+        self._results = []
+        self._elapsed = 0
+
+    @property
+    def results(self):
+        return self._results
+
+    def matches(self):
+        seed = self._seed
+        for pair in itertools.combinations(self._entries.items(), 2):
+            for _ in range(self._games):
+                yield list(pair), seed
+                seed += 1
+
+    def run(self):
+        matches = list(self.matches())
+        start = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=self._workers) as executor:
+            futures = [
+                executor.submit(play_game, entries, self._size, self._win, self._stone_each_turn, seed,
+                                self._record is not None, self._profile, self._clock)
+                for entries, seed in matches
+            ]
+            self._results = [future.result() for future in futures]
+
+        if self._record is not None:
+            writer = RecordWriter(self._record)
+            for result in self._results:
+                writer.append(result.pop('record'))
+            writer.close()
+
+        self._elapsed = time.perf_counter() - start
+        return self.report()
+
+    def report(self):
+        """
+        Win/draw/loss table of each entry and head to head, games per second, move latencies, generator resumes and
+        turns out of time of each entry and the total seconds of each section of Instrumentation
+        """
+        table = {title: {'wins': 0, 'draws': 0, 'losses': 0} for title in self._entries}
+        pairs = {}
+        latencies = {title: [] for title in self._entries}
+        resumes = {title: 0 for title in self._entries}
+        timeouts = {title: 0 for title in self._entries}
+        sections = {section: 0. for section in SECTIONS}
+        for result in self._results:
+            for title in result['players']:
+                if result['winner'] is None:
+                    key = 'draws'
+                elif result['winner'] == title:
+                    key = 'wins'
+                else:
+                    key = 'losses'
+
+                table[title][key] += 1
+                rivals = [rival for rival in result['players'] if rival != title]
+                head = pairs.setdefault(title, {}).setdefault(' vs '.join(rivals), {'wins': 0, 'draws': 0, 'losses': 0})
+                head[key] += 1
+                latencies[title].extend(result['latencies'][title])
+                resumes[title] += result['resumes'][title]
+                timeouts[title] += result['timeouts'][title]
+
+            for section, seconds in result['sections'].items():
+                sections[section] += seconds
+
+        latency = {title: dict(latency_summary(values), resumes=resumes[title], timeouts=timeouts[title])
+                   for title, values in latencies.items()}
+
+        return {
+            'games': len(self._results),
+            'elapsed': self._elapsed,
+            'games_per_second': len(self._results) / self._elapsed if self._elapsed else 0.,
+            'table': table,
+            'head_to_head': pairs,
+            'latency': latency,
+            'sections': sections,
+        }
+
+
+def print_report(report):
+    print('%d games in %.2fs (%.1f games/s)' % (report['games'], report['elapsed'], report['games_per_second']))
+    print()
+    print('%-16s %8s %8s %8s' % ('', 'wins', 'draws', 'losses'))
+    for title, row in report['table'].items():
+        print('%-16s %8d %8d %8d' % (title, row['wins'], row['draws'], row['losses']))
+
+    print()
+    print('%-16s %8s %8s %10s %10s %10s %10s %8s' % (
+        '', 'moves', 'resumes', 'mean ms', 'p50 ms', 'p99 ms', 'max ms', 'timeouts'))
+    for title, row in report['latency'].items():
+        print('%-16s %8d %8d %10.3f %10.3f %10.3f %10.3f %8d' % (
+            title, row['moves'], row['resumes'], row['mean_ms'], row['p50_ms'], row['p99_ms'], row['max_ms'],
+            row['timeouts']))
+
+    print()
+    total = sum(report['sections'].values())
+    for section, seconds in report['sections'].items():
+        print('%-16s %10.3fs %6.1f%%' % (section, seconds, 100 * seconds / total if total else 0.))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run a headless round-robin tournament between bots')
+    parser.add_argument('bots', nargs='+', help="bots as title=module:Class, e.g. greedy=bots.greedy:Greedy")
+    parser.add_argument('--games', type=int, default=10, help='games of each pair of bots')
+    parser.add_argument('--size', type=int, default=13)
+    parser.add_argument('--win', type=int, default=6)
+    parser.add_argument('--stone-each-turn', type=int, default=2)
+    parser.add_argument('--workers', type=int, default=None, help='number of processes, default is cpu count')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', help='write the report to this file')
+    parser.add_argument('--record', help='append the games to this record file')
+    parser.add_argument('--profile', help='profile the bots and write the profiles with this path prefix')
+    parser.add_argument('--move-time', type=float, help='seconds for each stone')
+    parser.add_argument('--game-time', type=float, help='seconds for all stones of a bot in a game')
+    parser.add_argument('--increment', type=float, default=0., help='seconds added to the game time after each stone')
+    args = parser.parse_args()
+
+    entries = {}
+    for bot in args.bots:
+        title, _, spec = bot.rpartition('=')
+        entries[title or spec] = BotFactory(spec)
+
+    clock = None
+    if args.move_time is not None or args.game_time is not None:
+        clock = Clock(per_move=args.move_time, per_game=args.game_time, increment=args.increment)
+
+    tournament = Tournament(entries, games=args.games, size=args.size, win=args.win,
+                            stone_each_turn=args.stone_each_turn, workers=args.workers, seed=args.seed,
+                            record=args.record, profile=args.profile, clock=clock)
+    report = tournament.run()
+    print_report(report)
+
+    if args.json:
+        with open(args.json, 'w') as file:
+            json.dump(report, file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
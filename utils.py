@@ -1,4 +1,9 @@
 import numpy as np
+from functools import lru_cache
+from numpy.lib.stride_tricks import sliding_window_view
+
+# Value of the extra cell after the board cells, line tables point to it to pad lines shorter than the board size
+OFF_BOARD = -1
 
 
 class Partition(object):
@@ -38,84 +43,240 @@ class Partition(object):
         return self._end
 
 
+class LineTables(object):
+    def __init__(self, size):
+        """
+        Index arrays of every line of a board with the given size, they are built once per size and shared
+        between boards as read-only arrays. Lines are ordered as rows, columns, ascending and descending lines.
+        cell_lines refers to ids of the four lines through each cell and cell_offsets to the index of the cell
+        along each of them. matrix refers to flat cell indexes of every line padded with the off board cell.
+        """
+        self.size = size
+        lines = []
+        for i in range(size):
+            lines.append((np.full(size, i), np.arange(size)))
+
+        for i in range(size):
+            lines.append((np.arange(size), np.full(size, i)))
+
+        for i in range(-size + 1, size):
+            x = np.arange(max(0, i), min(size, i + size))
+            lines.append((x, np.flip(x)))
+
+        for i in range(-size + 1, size):
+            x = np.arange(max(0, i), min(size, i + size))
+            lines.append((x, size - np.flip(x) - 1))
+
+        self.cell_lines = np.zeros((size, size, 4), dtype=np.int32)
+        self.cell_offsets = np.zeros((size, size, 4), dtype=np.int32)
+        for line_id, (x, y) in enumerate(lines):
+            x.flags.writeable = False
+            y.flags.writeable = False
+            direction = self.direction_of(line_id)
+            self.cell_lines[x, y, direction] = line_id
+            self.cell_offsets[x, y, direction] = np.arange(len(x))
+
+        self.matrix = np.full((len(lines), size), size * size, dtype=np.intp)
+        self.lengths = np.zeros(len(lines), dtype=np.int32)
+        for line_id, (x, y) in enumerate(lines):
+            self.matrix[line_id, :len(x)] = x * size + y
+            self.lengths[line_id] = len(x)
+
+        self.cell_lines.flags.writeable = False
+        self.cell_offsets.flags.writeable = False
+        self.matrix.flags.writeable = False
+        self.lengths.flags.writeable = False
+        self.lines = tuple(lines)
+
+    def direction_of(self, line_id):
+        """0 for rows, 1 for columns, 2 for ascending and 3 for descending lines"""
+        if line_id < 2 * self.size:
+            return line_id // self.size
+        return 2 + (line_id - 2 * self.size) // (2 * self.size - 1)
+
+    @lru_cache(maxsize=None)
+    def windows(self, win):
+        """Flat cell indexes of every range with length win on every line, as an array with shape (windows, win)"""
+        if win > self.size:
+            return np.zeros((0, win), dtype=np.intp)
+
+        windows = sliding_window_view(self.matrix, win, axis=1)
+        inside = np.arange(self.size - win + 1) + win <= self.lengths[:, None]
+        windows = windows[inside]
+        windows.flags.writeable = False
+        return windows
+
+    @lru_cache(maxsize=None)
+    def cell_windows(self, win):
+        """
+        Ids of the ranges with length win through each cell, as an array with shape (size * size, 4 * win)
+        padded with the number of ranges
+        """
+        windows = self.windows(win)
+        cells = windows.reshape(-1)
+        ids = np.repeat(np.arange(len(windows)), win)
+        order = np.argsort(cells, kind='stable')
+        cells, ids = cells[order], ids[order]
+
+        first = np.searchsorted(cells, cells, side='left')
+        table = np.full((self.size * self.size, 4 * win), len(windows), dtype=np.intp)
+        table[cells, np.arange(len(cells)) - first] = ids
+        table.flags.writeable = False
+        return table
+
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def of(size):
+        return LineTables(size)
+
+
+@lru_cache(maxsize=None)
+def zobrist_keys(size, index):
+    """Random Zobrist keys of the cells for a player index, they are the same for every board with the same size"""
+    keys = np.random.default_rng((size, index)).integers(0, 2 ** 63, size * size, dtype=np.int64)
+    keys.flags.writeable = False
+    return keys
+
+
+class Symmetries(object):
+    def __init__(self, size):
+        """
+        The 8 rotations and reflections of a board with the given size. maps[t] refers to the flat index
+        that each cell moves to by transform t, transform 0 is the identity and inverse[t] undoes t.
+        """
+        self.size = size
+        cells = np.arange(size * size).reshape(size, size)
+        maps = []
+        for grid in (cells, cells.T):
+            for k in range(4):
+                moved = np.rot90(grid, k).reshape(-1)
+                target = np.empty(size * size, dtype=np.intp)
+                target[moved] = np.arange(size * size)
+                maps.append(target)
+
+        self.maps = np.array(maps)
+        self.inverse = np.array([
+            next(u for u in range(8) if (self.maps[u][self.maps[t]] == np.arange(size * size)).all())
+            for t in range(8)
+        ])
+        self.maps.flags.writeable = False
+        self.inverse.flags.writeable = False
+
+    def apply(self, array, transform):
+        """Transform an array with shape (size, size, ...) or (size * size, ...) that is indexed by cells"""
+        shape = array.shape
+        flat = array.reshape((self.size * self.size,) + shape[2 if shape[:2] == (self.size, self.size) else 1:])
+        result = np.empty_like(flat)
+        result[self.maps[transform]] = flat
+        return result.reshape(shape)
+
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def of(size):
+        return Symmetries(size)
+
+
+@lru_cache(maxsize=None)
+def symmetric_zobrist_keys(size, index):
+    """
+    Zobrist keys of the cells for a player index under each transform of Symmetries, with shape (size * size, 8).
+    XOR of the keys of the stones is the hash of the board after each transform.
+    """
+    keys = zobrist_keys(size, index)[Symmetries.of(size).maps.T]
+    keys.flags.writeable = False
+    return keys
+
+
+def canonical_hash(grid):
+    """
+    Lowest hash of a (size, size) array of player indices (0 refers to an empty cell) under the transforms
+    of Symmetries, and the transform that gives it, e.g. the grid of a board
+    :return: Tuple[int, int]
+    """
+    size = grid.shape[0]
+    flat = grid.reshape(-1)
+    cells = np.flatnonzero(flat)
+    owners = flat[cells]
+    hashes = np.zeros(8, dtype=np.int64)
+    for index in np.unique(owners).tolist():
+        hashes ^= np.bitwise_xor.reduce(symmetric_zobrist_keys(size, index)[cells[owners == index]], axis=0)
+
+    transform = int(hashes.argmin())
+    return int(hashes[transform]), transform
+
+
 class Utils(object):
-    def __init__(self, size, board_map):
+    def __init__(self, size, cells, players):
+        """
+        cells is the flat int8 array of player indices of the board followed by the off board cell,
+        and players maps these indices to Player instances
+        """
         self.size = size
-        self.map = board_map
+        self.cells = cells
+        self.grid = cells[:size * size].reshape(size, size)
+        self.players = players
+        self.tables = LineTables.of(size)
 
     def line_partition(self, x, y):
-        line = self.map[x, y]
+        line = self.grid[x, y]
+        bounds = np.flatnonzero(np.diff(line)) + 1
+        starts = np.concatenate(([0], bounds))
+        ends = np.concatenate((bounds, [len(line)])) - 1
+
         parts = []
-        player = None
-        count = 0
-        start = 0
-        start_point = x[0], y[0]
-        for i, stone in enumerate(line):
-            owner = stone.owner if stone is not None else None
-            if owner == player:
-                count += 1
-            else:
-                if count:
-                    parts.append(Partition(player, count, start, i - 1, start_point, (x[i-1], y[i-1])))
-
-                player = owner
-                count = 1
-                start = i
-                start_point = x[i], y[i]
-
-        if count:
-            parts.append(Partition(player, count, start, len(line) - 1, start_point, (x[-1], y[-1])))
+        for start, end in zip(starts, ends):
+            player = self.players[line[start]]
+            parts.append(Partition(player, int(end - start + 1), start, end, (x[start], y[start]), (x[end], y[end])))
 
         return parts
 
+    def line_values(self):
+        """Player indices of every line in one array with shape (lines, size), padded with OFF_BOARD"""
+        return self.cells[self.tables.matrix]
+
+    @staticmethod
+    def count_windows(values, player, win):
+        """
+        Count stones of the player, stones of rivals and empty cells of every range with length win on every line.
+        values is the output of line_values, the result arrays have shape (lines, size - win + 1),
+        ranges that exceed their line count the off board cells as rival stones.
+        """
+        lines, size = values.shape
+        if win > size:
+            empty = np.zeros((lines, 0), dtype=np.int32)
+            return empty, empty, empty
+
+        own = np.zeros((lines, size + 1), dtype=np.int32)
+        free = np.zeros((lines, size + 1), dtype=np.int32)
+        np.cumsum(values == player, axis=1, out=own[:, 1:])
+        np.cumsum(values == 0, axis=1, out=free[:, 1:])
+
+        own = own[:, win:] - own[:, :-win]
+        free = free[:, win:] - free[:, :-win]
+        return own, win - own - free, free
+
     def get_rows_indexes(self):
-        for i in range(self.size):
-            yield i * np.ones(self.size, dtype=int), np.arange(0, self.size)
+        for x, y in self.tables.lines[:self.size]:
+            yield x, y
 
     def get_cols_indexes(self):
-        for i in range(self.size):
-            yield np.arange(0, self.size), i * np.ones(self.size, dtype=int)
+        for x, y in self.tables.lines[self.size:2 * self.size]:
+            yield x, y
 
     def get_ascending_line_indexes(self):
-        for i in range(-self.size + 1, self.size):
-            x = np.arange(max(0, i), min(self.size, i + self.size))
-            y = np.flip(x)
+        for x, y in self.tables.lines[2 * self.size:4 * self.size - 1]:
             yield x, y
 
     def get_descending_line_indexes(self):
-        for i in range(-self.size + 1, self.size):
-            x = np.arange(max(0, i), min(self.size, i + self.size))
-            y = self.size - np.flip(x) - 1
+        for x, y in self.tables.lines[4 * self.size - 1:]:
             yield x, y
 
     def get_every_lines_indexes(self, cross_point=None):
+        tables = self.tables
         if cross_point:
-            row, col = cross_point
-
-            yield row * np.ones(self.size, dtype=int), np.arange(0, self.size)
-            yield np.arange(0, self.size), col * np.ones(self.size, dtype=int)
-
-            total = row + col + 1
-            sub = row - col
-
-            x = np.arange(max(0, total - self.size), min(self.size, total))
-            y = np.flip(x)
-            yield x, y
-
-            x = np.arange(max(0, sub), min(self.size, sub + self.size))
-            y = self.size - np.flip(x) - 1
-            yield x, y
+            for line_id in tables.cell_lines[cross_point[0], cross_point[1]]:
+                yield tables.lines[line_id]
 
         else:
-
-            for x, y in self.get_rows_indexes():
-                yield x, y
-
-            for x, y in self.get_cols_indexes():
-                yield x, y
-
-            for x, y in self.get_ascending_line_indexes():
-                yield x, y
-
-            for x, y in self.get_descending_line_indexes():
+            for x, y in tables.lines:
                 yield x, y